@@ -0,0 +1,276 @@
+"""
+Backend de cache compartilhado entre processos, sem Redis.
+
+Os workers do gunicorn não enxergam o LocMemCache uns dos outros, então uma
+invalidação feita num worker não vale para os demais. Este backend guarda as
+entradas num arquivo SQLite em modo WAL: leituras não bloqueiam escritas, toda
+alteração (set, delete, incr) é vista na hora por todos os processos que usam o
+mesmo arquivo, e incr é atômico (chaves de versão).
+
+Uso em settings.CACHES:
+
+    "BACKEND": "cantina.cache.SQLiteCache",
+    "LOCATION": "/caminho/cache.sqlite3",
+    "OPTIONS": {"MAX_ENTRIES": 5000, "MAX_BYTES": 64 * 1024 * 1024},
+
+Acima de MAX_ENTRIES (ou de MAX_BYTES, somando os valores serializados) as
+entradas menos usadas recentemente são removidas, 1/CULL_FREQUENCY por vez.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+INT64_MIN, INT64_MAX = -(2**63), 2**63 - 1
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    chave   TEXT PRIMARY KEY,
+    valor   BLOB NOT NULL,
+    expira  REAL,              -- epoch; NULL = não expira
+    acesso  REAL NOT NULL,     -- último uso, para o LRU
+    tamanho INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_acesso ON cache (acesso);
+"""
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    # o horário de acesso só é regravado se tiver mais que isso (segundos), para
+    # que leituras repetidas da mesma chave não virem uma escrita cada
+    RESOLUCAO_LRU = 5
+    # a checagem de limites (COUNT/SUM) roda a cada N gravações deste processo
+    CULL_A_CADA = 16
+    # conexões guardadas para reuso; as que sobram acima disso são fechadas
+    CONEXOES_MAX = 8
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._caminho = str(location)
+        options = params.get("OPTIONS", {})
+        self._max_bytes = int(options.get("MAX_BYTES", 0)) or None
+        self._trava = threading.Lock()
+        self._livres = []  # conexões deste processo prontas para reuso
+        self._pid = None
+        self._gravacoes = 0
+
+    # ---- conexão -------------------------------------------------------
+
+    def _preparar(self):
+        # esquema e WAL uma vez por processo; o modo WAL fica gravado no arquivo
+        os.makedirs(os.path.dirname(os.path.abspath(self._caminho)), exist_ok=True)
+        conn = sqlite3.connect(self._caminho, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(ESQUEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _conexao(self):
+        """
+        Conexão emprestada do pool do processo. Sob ASGI cada requisição roda
+        numa thread nova, então a conexão não pode ficar presa à thread.
+        """
+        pid = os.getpid()
+        with self._trava:
+            if self._pid != pid:  # primeiro uso, ou fork do worker: as conexões herdadas não valem
+                self._preparar()
+                self._livres, self._pid = [], pid
+            conn = self._livres.pop() if self._livres else None
+        if conn is None:
+            conn = sqlite3.connect(self._caminho, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")  # em WAL, sem fsync a cada commit
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._trava:
+                if self._pid == pid and len(self._livres) < self.CONEXOES_MAX:
+                    self._livres.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    # ---- serialização --------------------------------------------------
+
+    def _codificar(self, value):
+        # inteiros ficam nativos para que incr seja um UPDATE atômico no próprio SQLite;
+        # fora dos 64 bits com sinal do INTEGER do SQLite, vão em pickle
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            return value, 8
+        dados = pickle.dumps(value, self.pickle_protocol)
+        return dados, len(dados)
+
+    @staticmethod
+    def _decodificar(valor):
+        return valor if isinstance(valor, int) else pickle.loads(valor)
+
+    # ---- API do cache --------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        agora = time.time()
+        with self._conexao() as conn:
+            row = conn.execute("SELECT valor, expira, acesso FROM cache WHERE chave = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            valor, expira, acesso = row
+            if expira is not None and expira <= agora:
+                return default
+            if agora - acesso > self.RESOLUCAO_LRU:
+                conn.execute("UPDATE cache SET acesso = ? WHERE chave = ?", (agora, key))
+        return self._decodificar(valor)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._gravar(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._gravar(key, value, timeout, somente_se_ausente=True)
+
+    def _gravar(self, key, value, timeout, somente_se_ausente=False):
+        agora = time.time()
+        expira = self.get_backend_timeout(timeout)
+        valor, tamanho = self._codificar(value)
+        sql = (
+            "INSERT INTO cache (chave, valor, expira, acesso, tamanho) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira, "
+            "acesso = excluded.acesso, tamanho = excluded.tamanho"
+        )
+        params = [key, valor, expira, agora, tamanho]
+        if somente_se_ausente:
+            sql += " WHERE cache.expira IS NOT NULL AND cache.expira <= ?"
+            params.append(agora)
+        with self._conexao() as conn:
+            gravou = conn.execute(sql, params).rowcount > 0
+            if gravou:
+                self._talvez_cull(conn, agora)
+        return gravou
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        agora = time.time()
+        expira = self.get_backend_timeout(timeout)
+        linhas = []
+        for key, value in data.items():
+            key = self.make_and_validate_key(key, version=version)
+            linhas.append((key, *self._codificar(value)))
+        with self._conexao() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache (chave, valor, expira, acesso, tamanho) VALUES (?, ?, ?, ?, ?)",
+                    [(key, valor, expira, agora, tamanho) for key, valor, tamanho in linhas],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._talvez_cull(conn, agora)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        agora = time.time()
+        with self._conexao() as conn:
+            cur = conn.execute(
+                "UPDATE cache SET expira = ?, acesso = ? WHERE chave = ? AND (expira IS NULL OR expira > ?)",
+                (self.get_backend_timeout(timeout), agora, key, agora),
+            )
+            return cur.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._conexao() as conn:
+            return conn.execute("DELETE FROM cache WHERE chave = ?", (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._conexao() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        agora = time.time()
+        with self._conexao() as conn:
+            if INT64_MIN <= delta <= INT64_MAX:
+                # um único UPDATE: atômico entre processos sem precisar de trava própria.
+                # A faixa evita que a soma estoure os 64 bits (o SQLite viraria REAL).
+                limite = "valor <= ? - ?" if delta >= 0 else "valor >= ? - ?"
+                row = conn.execute(
+                    "UPDATE cache SET valor = valor + ?, acesso = ? "
+                    "WHERE chave = ? AND typeof(valor) = 'integer' AND (expira IS NULL OR expira > ?) "
+                    f"AND {limite} RETURNING valor",
+                    (delta, agora, key, agora, INT64_MAX if delta >= 0 else INT64_MIN, delta),
+                ).fetchall()  # consome o cursor para finalizar o UPDATE e soltar a trava
+                if row:
+                    return row[0][0]
+
+            # valor não inteiro (ex.: Decimal) ou fora dos 64 bits: lê e regrava numa transação de escrita
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT valor FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)", (key, agora)
+                ).fetchone()
+                if row is None:
+                    raise ValueError("Key '%s' not found" % key)
+                novo = self._decodificar(row[0]) + delta
+                valor, tamanho = self._codificar(novo)
+                conn.execute(
+                    "UPDATE cache SET valor = ?, tamanho = ?, acesso = ? WHERE chave = ?", (valor, tamanho, agora, key)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return novo
+
+    def clear(self):
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # as conexões voltam ao pool do processo ao fim de cada operação
+        pass
+
+    # ---- limites (LRU) -------------------------------------------------
+
+    def _talvez_cull(self, conn, agora):
+        self._gravacoes += 1
+        if self._gravacoes % self.CULL_A_CADA == 0:
+            self._cull(conn, agora)
+
+    def _cull(self, conn, agora):
+        conn.execute("DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?", (agora,))
+        total, bytes_ = conn.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache").fetchone()
+        excede_bytes = self._max_bytes is not None and bytes_ > self._max_bytes
+        if total <= self._max_entries and not excede_bytes:
+            return
+        if self._cull_frequency == 0:
+            conn.execute("DELETE FROM cache")
+            return
+
+        remover = max(total // self._cull_frequency, total - self._max_entries)
+        if excede_bytes:
+            # menos usados primeiro até voltar para baixo do limite de bytes
+            liberar, contados = bytes_ - self._max_bytes, 0
+            tamanhos = conn.execute("SELECT tamanho FROM cache ORDER BY acesso").fetchall()
+            for i, (tamanho,) in enumerate(tamanhos, 1):
+                contados += tamanho
+                if contados >= liberar:
+                    remover = max(remover, i)
+                    break
+        conn.execute(
+            "DELETE FROM cache WHERE chave IN (SELECT chave FROM cache ORDER BY acesso LIMIT ?)", (remover,)
+        )
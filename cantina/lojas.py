@@ -0,0 +1,108 @@
+"""
+Multi-loja: um banco por cantina, escolhido pela requisição.
+
+settings.LOJAS mapeia o alias do banco de cada loja para os hosts que a
+atendem; a loja também pode vir de um prefixo de caminho (/l/<loja>/...).
+Sem correspondência, vale o banco "default". O middleware guarda a loja num
+ContextVar (acompanha sync_to_async e as views assíncronas), o roteador manda
+leituras e escritas para ela e a chave de cache ganha o alias como prefixo.
+
+Fora de uma requisição (comandos de gerenciamento), a loja vem da variável de
+ambiente CANTINA_LOJA; `manage.py rodar_em_lojas` usa isso para rodar um
+comando em todas as lojas.
+"""
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.urls import get_script_prefix, set_script_prefix
+from django.utils.decorators import sync_and_async_middleware
+
+_loja = ContextVar("cantina_loja", default=None)
+
+PREFIXO = re.compile(r"^/l/(?P<loja>[\w-]+)(?=/)")
+
+
+def lojas():
+    """Aliases de todas as lojas, começando pelo banco padrão."""
+    return [DEFAULT_DB_ALIAS, *(alias for alias in settings.LOJAS if alias != DEFAULT_DB_ALIAS)]
+
+
+def loja_atual():
+    return _loja.get() or os.environ.get("CANTINA_LOJA") or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def usando_loja(alias):
+    token = _loja.set(alias)
+    try:
+        yield
+    finally:
+        _loja.reset(token)
+
+
+def _hosts():
+    return {host: alias for alias, hosts in settings.LOJAS.items() for host in hosts}
+
+
+def resolver_loja(request):
+    """(alias, prefixo de caminho ou "") da loja que atende esta requisição."""
+    casou = PREFIXO.match(request.path_info)
+    if casou and casou["loja"] in settings.LOJAS:
+        return casou["loja"], casou.group(0)
+    host = request.get_host().split(":")[0]
+    return _hosts().get(host, DEFAULT_DB_ALIAS), ""
+
+
+@contextmanager
+def _ativar(request):
+    alias, prefixo = resolver_loja(request)
+    request.loja = alias
+    script_prefix = get_script_prefix()
+    if prefixo:
+        # /l/centro/pedidos/ resolve como /pedidos/ e reverse() devolve /l/centro/...
+        request.path_info = request.path_info[len(prefixo):]
+        set_script_prefix(script_prefix.rstrip("/") + prefixo + "/")
+    try:
+        with usando_loja(alias):
+            yield
+    finally:
+        set_script_prefix(script_prefix)
+
+
+@sync_and_async_middleware
+def LojaMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with _ativar(request):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with _ativar(request):
+                return get_response(request)
+    return middleware
+
+
+class RoteadorLojas:
+    """Todas as apps moram no banco da loja ativa; cada loja tem o esquema completo."""
+
+    def _banco(self, hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return loja_atual()
+
+    def db_for_read(self, model, **hints):
+        return self._banco(hints)
+
+    def db_for_write(self, model, **hints):
+        return self._banco(hints)
+
+
+def chave_cache(key, key_prefix, version):
+    """KEY_FUNCTION do cache: lojas diferentes nunca compartilham entradas."""
+    return f"{loja_atual()}:{key_prefix}:{version}:{key}"
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cantina.lojas.LojaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,10 +78,69 @@ WSGI_APPLICATION = 'cantina.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# IMMEDIATE: a transação pega a trava de escrita no BEGIN e espera até `timeout`
+# segundos por ela; no modo padrão (DEFERRED) duas confirmações que leram antes
+# de escrever falham na hora com "database is locked".
+SQLITE_OPTIONS = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+    }
+}
+
+# Multi-loja (opcional): cada cantina ganha um banco próprio, escolhido pelo host
+# ou pelo prefixo /l/<loja>/ (ver cantina/lojas.py). Formato:
+#   CANTINA_LOJAS="centro=centro.exemplo.com;centro.local,escola=escola.exemplo.com"
+# Sem a variável, tudo continua no banco "default".
+
+LOJAS = {}
+for _loja in filter(None, os.environ.get('CANTINA_LOJAS', '').split(',')):
+    _alias, _, _hosts = _loja.partition('=')
+    _alias = _alias.strip()
+    LOJAS[_alias] = [h.strip() for h in _hosts.split(';') if h.strip()]
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_{_alias}.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+    }
+
+# os testes de roteamento (cantina/tests.py) precisam de uma segunda loja; o
+# banco de teste de cada alias é criado antes de qualquer override_settings
+if sys.argv[1:2] == ['test']:
+    DATABASES.setdefault('centro', {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_centro.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+    })
+
+DATABASE_ROUTERS = ['cantina.lojas.RoteadorLojas']
+
+# Confirmação em grupo (pedidos/agendador.py): junta as confirmações que chegam
+# dentro da janela numa transação só. Exige workers com threads ou ASGI.
+CONFIRMACAO_EM_GRUPO = os.environ.get('CONFIRMACAO_EM_GRUPO') == '1'
+CONFIRMACAO_JANELA_MS = 5
+CONFIRMACAO_LOTE_MAX = 32
+# quanto a requisição espera pelo lote; maior que o timeout de trava do SQLite
+CONFIRMACAO_TIMEOUT = 2 * SQLITE_OPTIONS['timeout']
+
+
+# Cache
+# Compartilhado entre os workers do gunicorn (mesmo arquivo SQLite em WAL);
+# o LocMemCache padrão é por processo e não propaga invalidações.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'cantina.cache.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_SQLITE_PATH', BASE_DIR / 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'KEY_FUNCTION': 'cantina.lojas.chave_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'MAX_BYTES': 64 * 1024 * 1024,
+        },
     }
 }
 
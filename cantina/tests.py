@@ -0,0 +1,170 @@
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from cantina.cache import SQLiteCache
+from cantina.lojas import usando_loja
+from pedidos.models import Pedido, Produto
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _cache(self, **options):
+        cache = SQLiteCache(Path(self.dir) / "cache.sqlite3", {"TIMEOUT": 300, "OPTIONS": options})
+        cache.CULL_A_CADA = 1  # checa os limites a cada gravação
+        return cache
+
+    def _relogio(self, inicio):
+        """Fixa time.time() em `inicio`; devolve uma função que o avança."""
+        agora = [inicio]
+        patcher = mock.patch("time.time", side_effect=lambda: agora[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def avancar(segundos):
+            agora[0] += segundos
+        return avancar
+
+    def test_add_so_grava_se_ausente_ou_expirada(self):
+        cache = self._cache()
+        avancar = self._relogio(time.time())
+        self.assertTrue(cache.add("k", "a", timeout=10))
+        self.assertFalse(cache.add("k", "b", timeout=10))
+        self.assertEqual(cache.get("k"), "a")
+
+        avancar(11)
+        self.assertTrue(cache.add("k", "c", timeout=10))
+        self.assertEqual(cache.get("k"), "c")
+
+    def test_incr(self):
+        cache = self._cache()
+        cache.set("nativo", 1)
+        self.assertEqual(cache.incr("nativo"), 2)
+        self.assertEqual(cache.incr("nativo", -5), -3)
+
+        cache.set("decimal", Decimal("1.50"))
+        self.assertEqual(cache.incr("decimal", 2), Decimal("3.50"))
+        self.assertEqual(cache.get("decimal"), Decimal("3.50"))
+
+        with self.assertRaises(ValueError):
+            cache.incr("ausente")
+
+    def test_inteiros_fora_de_64_bits(self):
+        cache = self._cache()
+        cache.set("grande", 2**70)
+        self.assertEqual(cache.get("grande"), 2**70)
+        self.assertEqual(cache.incr("grande"), 2**70 + 1)
+
+        cache.set("limite", 2**63 - 1)
+        self.assertEqual(cache.incr("limite"), 2**63)
+        self.assertEqual(cache.get("limite"), 2**63)
+
+    def test_ttl(self):
+        cache = self._cache()
+        avancar = self._relogio(time.time())
+        cache.set("curta", 1, timeout=5)
+        cache.set("eterna", 1, timeout=None)
+        cache.set("zero", 1, timeout=0)
+        self.assertIsNone(cache.get("zero"))
+        self.assertFalse(cache.has_key("zero"))
+        self.assertEqual(cache.get("curta"), 1)
+
+        avancar(6)
+        self.assertIsNone(cache.get("curta"))
+        self.assertEqual(cache.get("eterna"), 1)
+        self.assertFalse(cache.touch("curta"))
+
+    def test_cull_por_max_entries_remove_os_menos_usados(self):
+        cache = self._cache(MAX_ENTRIES=4, CULL_FREQUENCY=2)
+        avancar = self._relogio(time.time())
+        for i in range(4):
+            cache.set(f"k{i}", i)
+            avancar(cache.RESOLUCAO_LRU + 1)
+        cache.get("k0")  # k0 volta a ser recente
+        avancar(cache.RESOLUCAO_LRU + 1)
+
+        cache.set("k4", 4)
+
+        presentes = {k for k in ("k0", "k1", "k2", "k3", "k4") if cache.has_key(k)}
+        self.assertEqual(presentes, {"k0", "k3", "k4"})
+
+    def test_cull_por_max_bytes(self):
+        cache = self._cache(MAX_BYTES=1000)
+        avancar = self._relogio(time.time())
+        for i in range(5):
+            cache.set(f"k{i}", "x" * 300)
+            avancar(1)
+
+        with cache._conexao() as conn:
+            total = conn.execute("SELECT SUM(tamanho) FROM cache").fetchone()[0]
+        self.assertLessEqual(total, 1000)
+        self.assertTrue(cache.has_key("k4"))
+        self.assertFalse(cache.has_key("k0"))
+
+    def test_conexoes_reaproveitadas_entre_threads(self):
+        # sob ASGI cada requisição roda numa thread nova
+        cache = self._cache()
+        with mock.patch.object(cache, "_preparar", wraps=cache._preparar) as preparar:
+            for i in range(5):
+                t = threading.Thread(target=cache.set, args=(f"k{i}", i))
+                t.start()
+                t.join()
+        self.assertEqual(preparar.call_count, 1)
+        self.assertEqual(len(cache._livres), 1)
+        self.assertEqual(cache.get_many([f"k{i}" for i in range(5)]), {f"k{i}": i for i in range(5)})
+
+
+@override_settings(
+    LOJAS={"centro": ["centro.local"]},
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "KEY_FUNCTION": "cantina.lojas.chave_cache"}},
+)
+class RoteamentoLojasTests(TestCase):
+    databases = {"default", "centro"}
+
+    @classmethod
+    def setUpTestData(cls):
+        with usando_loja("centro"):
+            cls.pedido = Pedido.objects.create(nome_cliente="Centro")
+
+    def test_host_escolhe_o_banco(self):
+        url = reverse("pedidos:detalhe", args=[self.pedido.pk])
+        resposta = self.client.get(url, HTTP_HOST="centro.local")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.wsgi_request.loja, "centro")
+        self.assertEqual(self.client.get(url).status_code, 404)  # não existe no default
+
+    def test_prefixo_escolhe_o_banco_e_reverse_o_mantem(self):
+        resposta = self.client.get(f"/l/centro/pedidos/{self.pedido.pk}/")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.wsgi_request.loja, "centro")
+        self.assertContains(resposta, f'action="/l/centro/pedidos/{self.pedido.pk}/confirmar/"')
+        # fora da requisição, o script prefix volta ao normal
+        self.assertEqual(reverse("pedidos:detalhe", args=[self.pedido.pk]), f"/pedidos/{self.pedido.pk}/")
+
+    def test_escrita_numa_loja_nao_aparece_no_default(self):
+        with usando_loja("centro"):
+            Produto.objects.create(nome="Só no centro", preco=Decimal("1.00"), estoque=1)
+            self.assertTrue(Produto.objects.filter(nome="Só no centro").exists())
+        self.assertFalse(Produto.objects.filter(nome="Só no centro").exists())
+        self.assertFalse(Pedido.objects.filter(nome_cliente="Centro").exists())
+
+    def test_chaves_de_cache_separadas_por_loja(self):
+        cache.clear()
+        with usando_loja("centro"):
+            cache.set("k", "centro")
+        cache.set("k", "default")
+        with usando_loja("centro"):
+            self.assertEqual(cache.get("k"), "centro")
+        self.assertEqual(cache.get("k"), "default")
@@ -1,8 +1,10 @@
+import hashlib
 from django.contrib import admin
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from .models import Produto, Pedido, PedidoItem, MovimentoEstoque, ComandaCozinha
-from .services import confirmar_pedido, cancelar_pedido
+from .services import cancelar_pedido
+from .agendador import aguardar, enviar_confirmacao
 
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
@@ -16,12 +18,25 @@ class PedidoItemInline(admin.TabularInline):
     autocomplete_fields = ("produto",)
     fields = ("produto", "quantidade", "preco_unitario")
 
+def _chave_da_acao(request, acao):
+    """
+    O token CSRF mascarado muda a cada render do changelist, então reenviar o
+    mesmo formulário (duplo clique, retry) gera a mesma chave de idempotência.
+    """
+    token = request.POST.get("csrfmiddlewaretoken")
+    if not token:
+        return None
+    return hashlib.sha256(f"{acao}:{token}".encode()).hexdigest()[:64]
+
 @admin.action(description="Confirmar e Enviar à Cozinha")
 def action_confirmar(modeladmin, request, queryset):
     ok, falhas = 0, 0
-    for pedido in queryset:
+    chave = _chave_da_acao(request, "confirmar")
+    # enfileira todos antes de esperar: com o agendador ligado viram um lote só
+    futuros = [(pedido, enviar_confirmacao(pedido.id, chave=chave)) for pedido in queryset]
+    for pedido, futuro in futuros:
         try:
-            confirmar_pedido(pedido.id)
+            aguardar(futuro)
             ok += 1
         except ValidationError as e:
             falhas += 1
@@ -33,8 +48,9 @@ def action_confirmar(modeladmin, request, queryset):
 
 @admin.action(description="Cancelar pedido (restaura estoque)")
 def action_cancelar(modeladmin, request, queryset):
+    chave = _chave_da_acao(request, "cancelar")
     for pedido in queryset:
-        cancelar_pedido(pedido.id)
+        cancelar_pedido(pedido.id, chave=chave)
     messages.success(request, "Pedido(s) cancelado(s). Estoque restaurado.")
 
 @admin.register(Pedido)
@@ -42,6 +58,7 @@ class PedidoAdmin(admin.ModelAdmin):
     list_display = ("numero", "nome_cliente", "status", "total", "criado_em")
     list_filter = ("status", "criado_em")
     search_fields = ("numero", "nome_cliente")
+    readonly_fields = ("total",)  # mantido pelas escritas dos itens
     inlines = [PedidoItemInline]
     actions = [action_confirmar, action_cancelar]
 
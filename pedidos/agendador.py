@@ -0,0 +1,169 @@
+# pedidos/agendador.py
+"""
+Confirmação em grupo (group commit) para o SQLite.
+
+Cada confirmar_pedido é uma transação de escrita com o seu próprio fsync, e
+no SQLite só uma escreve por vez: com vários caixas confirmando no mesmo
+segundo, as requisições fazem fila na trava do banco e algumas estouram com
+"database is locked". Com settings.CONFIRMACAO_EM_GRUPO ligado, as
+confirmações vão para uma thread do processo que junta o que chegar em
+CONFIRMACAO_JANELA_MS e aplica tudo numa transação só, um savepoint por
+pedido: a falta de estoque de um pedido desfaz só o savepoint dele. Cada
+chamador recebe o próprio resultado (Pedido ou ValidationError) depois do
+COMMIT.
+
+O agrupamento é por processo; só há ganho com workers que atendem várias
+requisições ao mesmo tempo (gunicorn --threads, ou ASGI).
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from cantina.lojas import usando_loja
+
+from .models import Pedido
+from .services import confirmar_pedido
+
+
+class AgendadorConfirmacoes:
+    def __init__(self, janela_ms=5, lote_max=32):
+        self.janela = janela_ms / 1000
+        self.lote_max = lote_max
+        self.lotes = 0  # transações efetivamente abertas (para o benchmark)
+        self._fila = queue.SimpleQueue()
+        self._thread = None
+        self._trava = threading.Lock()
+
+    def enviar(self, pedido_id, *, chave=None, using=None):
+        """Enfileira a confirmação; o Future resolve depois do COMMIT do lote."""
+        futuro = Future()
+        self._garantir_thread()
+        self._fila.put((using or router.db_for_write(Pedido), pedido_id, chave, futuro))
+        return futuro
+
+    def _garantir_thread(self):
+        # criada sob demanda: depois do fork do gunicorn, cada worker tem a sua
+        if self._thread is None or not self._thread.is_alive():
+            with self._trava:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._laco, name="confirmacoes", daemon=True)
+                    self._thread.start()
+
+    def _laco(self):
+        while True:
+            pedidos = [self._fila.get()]
+            try:
+                limite = time.monotonic() + self.janela
+                while len(pedidos) < self.lote_max:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    try:
+                        pedidos.append(self._fila.get(timeout=restante))
+                    except queue.Empty:
+                        break
+
+                por_banco = {}
+                for alias, *resto in pedidos:
+                    por_banco.setdefault(alias, []).append(resto)
+                for alias, lote in por_banco.items():
+                    self._aplicar(alias, lote)
+            except Exception as e:
+                # a thread não pode morrer: quem espera um Future ficaria preso
+                for *_, futuro in pedidos:
+                    _resolver(futuro, None, e)
+
+    def _aplicar(self, alias, lote):
+        try:
+            resultados = self._transacao(alias, lote)
+        except Exception as e:
+            # conexão ou COMMIT falharam: nenhum pedido do lote foi gravado
+            resultados = [(futuro, None, e) for _, _, futuro in lote]
+        for futuro, pedido, erro in resultados:
+            _resolver(futuro, pedido, erro)
+
+    def _transacao(self, alias, lote):
+        connections[alias].close_if_unusable_or_obsolete()
+        resultados = []
+        with usando_loja(alias), transaction.atomic(using=alias):
+            for pedido_id, chave, futuro in lote:
+                sid = transaction.savepoint(using=alias)
+                try:
+                    resultados.append((futuro, confirmar_pedido(pedido_id, chave=chave), None))
+                    transaction.savepoint_commit(sid, using=alias)
+                except ValidationError as e:
+                    # regra de negócio: as escritas do pedido já foram desfeitas no
+                    # savepoint interno e o erro fica gravado na chave de idempotência
+                    transaction.savepoint_commit(sid, using=alias)
+                    resultados.append((futuro, None, e))
+                except Exception as e:
+                    transaction.savepoint_rollback(sid, using=alias)
+                    resultados.append((futuro, None, e))
+        self.lotes += 1
+        return resultados
+
+
+def _resolver(futuro, pedido, erro):
+    if futuro.done():
+        return
+    try:
+        if erro is None:
+            futuro.set_result(pedido)
+        else:
+            futuro.set_exception(erro)
+    except InvalidStateError:
+        pass  # cancelado pelo chamador nesse meio-tempo
+
+
+def aguardar(futuro):
+    """
+    Resultado do Future em até CONFIRMACAO_TIMEOUT segundos (acima do timeout
+    de trava do SQLite). Estourando, vira ValidationError para a tela: o lote
+    ainda pode gravar depois, e a chave de idempotência cobre a nova tentativa.
+    """
+    try:
+        return futuro.result(timeout=getattr(settings, "CONFIRMACAO_TIMEOUT", 30))
+    except TimeoutError:
+        raise ValidationError("A confirmação demorou demais; confira o pedido antes de tentar de novo.")
+
+
+_agendador = None
+_agendador_trava = threading.Lock()
+
+
+def agendador():
+    global _agendador
+    with _agendador_trava:
+        if _agendador is None:
+            _agendador = AgendadorConfirmacoes(
+                janela_ms=getattr(settings, "CONFIRMACAO_JANELA_MS", 5),
+                lote_max=getattr(settings, "CONFIRMACAO_LOTE_MAX", 32),
+            )
+        return _agendador
+
+
+def enviar_confirmacao(pedido_id, *, chave=None):
+    """
+    Future com o resultado de confirmar_pedido. Em grupo quando
+    CONFIRMACAO_EM_GRUPO está ligado; senão roda aqui mesmo.
+    """
+    alias = router.db_for_write(Pedido)
+    # dentro de uma transação do chamador, esperar a thread travaria o banco
+    if getattr(settings, "CONFIRMACAO_EM_GRUPO", False) and not connections[alias].in_atomic_block:
+        return agendador().enviar(pedido_id, chave=chave, using=alias)
+    futuro = Future()
+    try:
+        futuro.set_result(confirmar_pedido(pedido_id, chave=chave))
+    except Exception as e:
+        futuro.set_exception(e)
+    return futuro
+
+
+def confirmar(pedido_id, *, chave=None):
+    """confirmar_pedido, passando pelo agendador quando ligado."""
+    return aguardar(enviar_confirmacao(pedido_id, chave=chave))
@@ -0,0 +1,174 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from pedidos.models import ComandaCozinha, MovimentoEstoque, Pedido, PedidoItem, Produto
+
+
+def consultas_quentes():
+    """
+    (nome, callable) das consultas que as views e services disparam a cada
+    acesso. Mantenha em sincronia com o código de origem indicado no nome.
+    """
+    agora = timezone.now()
+    inicio_dia = timezone.localtime(agora).replace(hour=0, minute=0, second=0, microsecond=0)
+    qs_hoje = Pedido.objects.filter(criado_em__gte=inicio_dia, criado_em__lt=inicio_dia + timedelta(days=1))
+    base_numero = f"{timezone.localdate():%Y%m%d}-"
+    pedido = Pedido.objects.filter(status=Pedido.Status.ENVIADO_COZINHA).first()
+    pedido_id = pedido.pk if pedido else 0
+
+    return [
+        ("views.home: pedidos de hoje", lambda: qs_hoje.count()),
+        ("views.home: concluídos hoje",
+         lambda: qs_hoje.filter(status=Pedido.Status.CONCLUIDO).count()),
+        ("views.home: faturamento de hoje", lambda: qs_hoje.aggregate(s=Sum("total"))),
+        ("views.home: últimos pedidos", lambda: list(Pedido.objects.order_by("-criado_em")[:10])),
+        ("views.cozinha_painel: comandas abertas",
+         lambda: list(ComandaCozinha.objects.select_related("pedido")
+                      .filter(pedido__status=Pedido.Status.ENVIADO_COZINHA)
+                      .order_by("impresso_em"))),
+        ("models.Pedido.gerar_numero: último do dia",
+         lambda: Pedido.objects.filter(numero__gte=base_numero, numero__lt=f"{base_numero[:-1]}.")
+                 .order_by("-numero").first()),
+        ("metricas.sla_ao_vivo: concluídos na última hora",
+         lambda: list(Pedido.objects
+                      .filter(status=Pedido.Status.CONCLUIDO,
+                              finalizado_em__gte=agora - timedelta(hours=1), finalizado_em__lt=agora)
+                      .annotate(inicio=Coalesce("comanda__impresso_em", "criado_em"))
+                      .values_list("inicio", "finalizado_em").order_by())),
+        ("metricas.resumo_periodo: fila aberta",
+         lambda: Pedido.objects.filter(status=Pedido.Status.ENVIADO_COZINHA,
+                                       comanda__isnull=False).count()),
+        ("views_estoque.saidas_por_produto: agregado",
+         lambda: list(MovimentoEstoque.objects.filter(tipo=MovimentoEstoque.Tipo.SAIDA)
+                      .values("produto_id", "produto__nome")
+                      .annotate(total_saiu=Sum("quantidade")).order_by("produto__nome")[:25])),
+        ("services.cancelar_pedido: saídas do pedido",
+         lambda: list(MovimentoEstoque.objects
+                      .filter(pedido_id=pedido_id, tipo=MovimentoEstoque.Tipo.SAIDA)
+                      .values("produto_id").annotate(q=Sum("quantidade")))),
+        ("context_processors.estoque_widget_data",
+         lambda: list(Produto.objects.filter(ativo=True).order_by("nome")
+                      .values("id", "nome", "estoque"))),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda as consultas quentes com EXPLAIN (QUERY PLAN no SQLite), aponta "
+        "varreduras completas e ordenações em B-tree temporária e mede o tempo de cada uma."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--semear", type=int, default=0, metavar="N",
+            help="Cria N pedidos sintéticos (e itens, comandas, movimentos) numa "
+                 "transação desfeita ao final; o banco não é alterado, mas a trava de "
+                 "escrita fica presa durante toda a análise (as confirmações esperam). "
+                 "Não use contra uma loja em funcionamento.",
+        )
+        parser.add_argument("--repeticoes", type=int, default=20, help="Execuções por consulta para medir o tempo.")
+
+    def handle(self, *args, **options):
+        # banco da loja ativa (CANTINA_LOJA); ver `manage.py rodar_em_lojas`
+        self.connection = connections[router.db_for_read(Pedido)]
+        if not options["semear"]:
+            # só leituras: sem transação, para não segurar a trava de escrita
+            # (transaction_mode IMMEDIATE) enquanto as consultas são medidas
+            self._analisar(options["repeticoes"])
+            return
+        with transaction.atomic(using=self.connection.alias):
+            self._semear(options["semear"])
+            self._analisar(options["repeticoes"])
+            transaction.set_rollback(True, using=self.connection.alias)
+
+    def _analisar(self, repeticoes):
+        connection = self.connection
+        prefixo = connection.ops.explain_query_prefix()
+        alertas = 0
+        for nome, consulta in consultas_quentes():
+            with CaptureQueriesContext(connection) as capturadas:
+                consulta()
+            tempos = []
+            for _ in range(repeticoes):
+                t0 = time.perf_counter()
+                consulta()
+                tempos.append((time.perf_counter() - t0) * 1000)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{nome}  ({statistics.median(tempos):.2f} ms)"))
+            for q in capturadas.captured_queries:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{prefixo} {q['sql']}")
+                    plano = [str(linha[-1]) for linha in cursor.fetchall()]
+                for linha in plano:
+                    problema = self._problema(linha)
+                    if problema:
+                        alertas += 1
+                        self.stdout.write(self.style.WARNING(f"  ! {linha}  <- {problema}"))
+                    else:
+                        self.stdout.write(f"    {linha}")
+
+        estilo = self.style.WARNING if alertas else self.style.SUCCESS
+        self.stdout.write(estilo(f"{alertas} alerta(s)."))
+
+    def _problema(self, linha):
+        if self.connection.vendor == "sqlite":
+            if linha.startswith("SCAN ") and "INDEX" not in linha:
+                return "varredura completa"
+            if "USE TEMP B-TREE" in linha:
+                return "ordenação/agrupamento em B-tree temporária"
+        else:
+            if "Seq Scan" in linha:
+                return "varredura completa"
+            if linha.lstrip(" ->").startswith("Sort"):
+                return "ordenação sem índice"
+        return None
+
+    def _semear(self, n):
+        agora = timezone.now()
+        produtos = Produto.objects.bulk_create(
+            Produto(nome=f"__semente {i:03d}", preco=random.randint(3, 40), estoque=10**6) for i in range(40)
+        )
+        pedidos = Pedido.objects.bulk_create(
+            Pedido(numero=f"S{i:09d}", nome_cliente=f"Cliente {i}") for i in range(n)
+        )
+        itens, comandas = [], []
+        for p in pedidos:
+            # ~1% ainda aberto na cozinha, alguns rascunhos/cancelados, o resto concluído
+            sorteio = random.random()
+            p.criado_em = agora - timedelta(minutes=random.randint(0, 60 * 24 * 90))
+            if sorteio < 0.01:
+                p.status = Pedido.Status.ENVIADO_COZINHA
+            elif sorteio < 0.05:
+                p.status = Pedido.Status.RASCUNHO
+            elif sorteio < 0.08:
+                p.status = Pedido.Status.CANCELADO
+            else:
+                p.status = Pedido.Status.CONCLUIDO
+                p.finalizado_em = p.criado_em + timedelta(minutes=random.randint(2, 40))
+            for produto in random.sample(produtos, random.randint(1, 3)):
+                itens.append(PedidoItem(pedido=p, produto=produto, quantidade=random.randint(1, 4),
+                                        preco_unitario=produto.preco))
+            if p.status != Pedido.Status.RASCUNHO:
+                comandas.append(ComandaCozinha(pedido=p))
+        Pedido.objects.bulk_update(pedidos, ["criado_em", "status", "finalizado_em"], batch_size=500)
+        PedidoItem.objects.bulk_create(itens, batch_size=500)
+        ComandaCozinha.objects.bulk_create(comandas, batch_size=500)
+        for c in comandas:
+            c.impresso_em = c.pedido.criado_em
+        ComandaCozinha.objects.bulk_update(comandas, ["impresso_em"], batch_size=500)
+        movimentos = [
+            MovimentoEstoque(produto_id=it.produto_id, pedido=it.pedido, item=it,
+                             tipo=MovimentoEstoque.Tipo.SAIDA, quantidade=it.quantidade)
+            for it in itens if it.pedido.status != Pedido.Status.RASCUNHO
+        ]
+        MovimentoEstoque.objects.bulk_create(movimentos, batch_size=500)
+        self.stdout.write(f"Semeados {n} pedidos, {len(itens)} itens, {len(movimentos)} movimentos.")
@@ -0,0 +1,68 @@
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import DEFAULT_DB_ALIAS, connection
+
+from cantina.cache import SQLiteCache
+
+TABELA_BENCH = "bench_cache_tmp"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a latência de get/set/incr do cantina.cache.SQLiteCache com "
+        "FileBasedCache e DatabaseCache (e LocMemCache como referência local)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ops", type=int, default=2000, help="Operações por medição.")
+        parser.add_argument("--tamanho", type=int, default=1024, help="Bytes por valor.")
+
+    def handle(self, *args, **options):
+        n, valor = options["ops"], "x" * options["tamanho"]
+        params = {"TIMEOUT": 300, "OPTIONS": {"MAX_ENTRIES": n * 2}}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            criar = CreateCacheTable()
+            criar.verbosity = 0
+            criar.create_table(DEFAULT_DB_ALIAS, TABELA_BENCH, dry_run=False)
+            try:
+                backends = [
+                    ("LocMemCache (por processo)", LocMemCache("bench", params)),
+                    ("SQLiteCache", SQLiteCache(Path(tmp) / "cache.sqlite3", params)),
+                    ("FileBasedCache", FileBasedCache(Path(tmp) / "arquivos", params)),
+                    ("DatabaseCache", DatabaseCache(TABELA_BENCH, params)),
+                ]
+                self.stdout.write(f"{n} ops, valores de {len(valor)} bytes; mediana / p99 em µs")
+                self.stdout.write(f"{'backend':<28}{'set':>18}{'get (hit)':>18}{'get (miss)':>18}{'incr':>18}")
+                for nome, cache in backends:
+                    cache.clear()
+                    linha = [
+                        self._medir(lambda i: cache.set(f"k{i}", valor), n),
+                        self._medir(lambda i: cache.get(f"k{i}"), n),
+                        self._medir(lambda i: cache.get(f"ausente{i}"), n),
+                    ]
+                    cache.set("versao", 0)
+                    linha.append(self._medir(lambda i: cache.incr("versao"), n))
+                    self.stdout.write(f"{nome:<28}" + "".join(f"{m:>18}" for m in linha))
+                    cache.clear()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {connection.ops.quote_name(TABELA_BENCH)}")
+
+    @staticmethod
+    def _medir(op, n):
+        tempos = []
+        for i in range(n):
+            t0 = time.perf_counter()
+            op(i)
+            tempos.append((time.perf_counter() - t0) * 1e6)
+        tempos.sort()
+        return f"{statistics.median(tempos):.1f} / {tempos[int(len(tempos) * 0.99) - 1]:.1f}"
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from pedidos.agendador import AgendadorConfirmacoes
+from pedidos.models import Pedido, PedidoItem, Produto
+from pedidos.services import confirmar_pedido
+
+PREFIXO = "BENCH-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a vazão de confirmações concorrentes: uma transação por pedido "
+        "(como hoje) contra o agendador em grupo (pedidos.agendador). Os dados "
+        "sintéticos são apagados ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=300, help="Pedidos confirmados por modo.")
+        parser.add_argument("--caixas", type=int, default=6, help="Threads confirmando ao mesmo tempo.")
+        parser.add_argument("--janela", type=float, default=5, help="Janela do agendador, em ms.")
+        parser.add_argument(
+            "--sem-estoque", type=float, default=0.1,
+            help="Fração dos pedidos que pede um produto esgotado (devem falhar sozinhos).",
+        )
+
+    def handle(self, *args, **options):
+        n, caixas = options["pedidos"], options["caixas"]
+        produtos = Produto.objects.bulk_create(
+            [Produto(nome=f"__bench {i}", preco=5, estoque=10**6) for i in range(10)]
+            + [Produto(nome="__bench esgotado", preco=5, estoque=0)]
+        )
+        try:
+            self.stdout.write(f"{n} pedidos por modo, {caixas} caixas simultâneos")
+            self.stdout.write(f"{'modo':<12}{'tempo':>9}{'ok/s':>9}{'ok':>6}{'sem estoque':>13}"
+                              f"{'locked':>8}{'outros':>8}{'transações':>12}")
+
+            ids = self._semear("direto", n, produtos, options["sem_estoque"])
+            self._rodar("direto", ids, caixas, lambda pid: confirmar_pedido(pid), lambda: len(ids))
+
+            agendador = AgendadorConfirmacoes(janela_ms=options["janela"], lote_max=64)
+            ids = self._semear("grupo", n, produtos, options["sem_estoque"])
+            self._rodar("em grupo", ids, caixas,
+                        lambda pid: agendador.enviar(pid).result(), lambda: agendador.lotes)
+        finally:
+            Pedido.objects.filter(numero__startswith=PREFIXO).delete()
+            Produto.objects.filter(pk__in=[p.pk for p in produtos]).delete()
+
+    @staticmethod
+    def _semear(modo, n, produtos, sem_estoque):
+        pedidos = Pedido.objects.bulk_create(
+            Pedido(numero=f"{PREFIXO}{modo}-{i:06d}", nome_cliente=f"Bench {i}") for i in range(n)
+        )
+        disponiveis, esgotado = produtos[:-1], produtos[-1]
+        itens = []
+        for p in pedidos:
+            for produto in random.sample(disponiveis, 2):
+                itens.append(PedidoItem(pedido=p, produto=produto, quantidade=1, preco_unitario=produto.preco))
+            if random.random() < sem_estoque:
+                itens.append(PedidoItem(pedido=p, produto=esgotado, quantidade=1, preco_unitario=esgotado.preco))
+        PedidoItem.objects.bulk_create(itens, batch_size=500)
+        return [p.pk for p in pedidos]
+
+    def _rodar(self, modo, ids, caixas, confirmar, transacoes):
+        contagem = {"ok": 0, "sem estoque": 0, "locked": 0, "outros": 0}
+        trava = threading.Lock()
+
+        def caixa(fatia):
+            try:
+                for pid in fatia:
+                    try:
+                        confirmar(pid)
+                        resultado = "ok"
+                    except ValidationError:
+                        resultado = "sem estoque"
+                    except OperationalError as e:
+                        resultado = "locked" if "locked" in str(e) else "outros"
+                    except Exception:
+                        resultado = "outros"
+                    with trava:
+                        contagem[resultado] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=caixa, args=(ids[i::caixas],)) for i in range(caixas)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        tempo = time.perf_counter() - t0
+
+        self.stdout.write(
+            f"{modo:<12}{tempo:>8.2f}s{contagem['ok'] / tempo:>9.0f}{contagem['ok']:>6}{contagem['sem estoque']:>13}"
+            f"{contagem['locked']:>8}{contagem['outros']:>8}{transacoes():>12}"
+        )
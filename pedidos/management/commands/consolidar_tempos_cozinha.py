@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from pedidos.metricas import consolidar
+
+
+class Command(BaseCommand):
+    help = "Consolida por hora os tempos de preparo da cozinha (quantis e fila) em TempoPreparoHora."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            help="Refaz o rollup a partir desta data/hora (YYYY-MM-DD ou YYYY-MM-DDTHH). "
+                 "Sem ela, processa só as horas fechadas ainda não consolidadas.",
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options["desde"]:
+            for formato in ("%Y-%m-%dT%H", "%Y-%m-%d"):
+                try:
+                    desde = timezone.make_aware(datetime.strptime(options["desde"], formato))
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise CommandError("Use --desde no formato YYYY-MM-DD ou YYYY-MM-DDTHH.")
+
+        horas = consolidar(desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"{horas} hora(s) consolidada(s)."))
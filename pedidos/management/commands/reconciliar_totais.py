@@ -0,0 +1,52 @@
+from contextlib import nullcontext
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from pedidos.models import Pedido
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere Pedido.total contra a soma dos itens (um único GROUP BY) "
+        "e corrige os divergentes com bulk_update."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--simular", action="store_true", help="Só lista as divergências, sem gravar.")
+
+    def handle(self, *args, **options):
+        dinheiro = DecimalField(max_digits=12, decimal_places=2)
+        calculados = (
+            Pedido.objects
+            .annotate(calculado=Coalesce(
+                Sum(F("itens__quantidade") * F("itens__preco_unitario"), output_field=dinheiro),
+                Value(Decimal("0")),
+                output_field=dinheiro,
+            ))
+            .values_list("pk", "numero", "total", "calculado")
+            .order_by()
+        )
+
+        agora = timezone.now()
+        divergentes = []
+        # corrigindo, leitura e gravação vão na mesma transação: no modo IMMEDIATE ela
+        # já começa com a trava de escrita, então nenhuma escrita de item cai no meio.
+        # Só simulando, é só leitura e não trava os caixas.
+        simular = options["simular"]
+        with nullcontext() if simular else transaction.atomic(using=router.db_for_write(Pedido)):
+            for pk, numero, total, calculado in calculados.iterator():
+                calculado = calculado.quantize(Decimal("0.01"))  # SQLite soma em ponto flutuante
+                if total != calculado:
+                    self.stdout.write(f"{numero}: {total} -> {calculado}")
+                    divergentes.append(Pedido(pk=pk, total=calculado, atualizado_em=agora))
+
+            if divergentes and not simular:
+                Pedido.objects.bulk_update(divergentes, ["total", "atualizado_em"], batch_size=500)
+
+        acao = "encontrado(s)" if simular else "corrigido(s)"
+        self.stdout.write(self.style.SUCCESS(f"{len(divergentes)} pedido(s) divergente(s) {acao}."))
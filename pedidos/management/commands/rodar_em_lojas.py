@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import get_commands, load_command_class
+from django.core.management.base import BaseCommand, CommandError
+
+from cantina.lojas import lojas
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda um comando de gerenciamento em todas as lojas (um processo por loja, "
+        "em paralelo). Ex.: manage.py rodar_em_lojas migrate; "
+        "manage.py rodar_em_lojas -- reconciliar_totais --simular"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("comando")
+        parser.add_argument("argumentos", nargs="...", help="Repassados ao comando.")
+        parser.add_argument("--lojas", help="Aliases separados por vírgula (padrão: todas).")
+        parser.add_argument("--paralelo", type=int, default=4, help="Lojas processadas ao mesmo tempo.")
+
+    def handle(self, *args, **options):
+        comando, argumentos = options["comando"], options["argumentos"]
+        if comando not in get_commands():
+            raise CommandError(f"Comando desconhecido: {comando}")
+        alvos = options["lojas"].split(",") if options["lojas"] else lojas()
+        desconhecidas = set(alvos) - set(settings.DATABASES)
+        if desconhecidas:
+            raise CommandError(f"Loja(s) sem banco configurado: {', '.join(sorted(desconhecidas))}")
+
+        # comandos com --database (migrate, createsuperuser, loaddata...) recebem o alias;
+        # os demais acham a loja pela variável CANTINA_LOJA (roteador de cantina.lojas)
+        repassar_banco = self._aceita_database(comando) and not any(
+            a.startswith("--database") for a in argumentos
+        )
+
+        def rodar(alias):
+            cmd = [sys.executable, str(settings.BASE_DIR / "manage.py"), comando, *argumentos]
+            if repassar_banco:
+                cmd.append(f"--database={alias}")
+            env = {**os.environ, "CANTINA_LOJA": alias}
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            return alias, proc.returncode, proc.stdout + proc.stderr
+
+        falhas = []
+        with ThreadPoolExecutor(max_workers=max(options["paralelo"], 1)) as pool:
+            for alias, codigo, saida in pool.map(rodar, alvos):
+                for linha in saida.splitlines():
+                    self.stdout.write(f"[{alias}] {linha}")
+                if codigo:
+                    falhas.append(alias)
+                    self.stdout.write(self.style.ERROR(f"[{alias}] terminou com código {codigo}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"[{alias}] ok"))
+
+        if falhas:
+            raise CommandError(f"Falhou em: {', '.join(falhas)}")
+
+    @staticmethod
+    def _aceita_database(comando):
+        parser = load_command_class(get_commands()[comando], comando).create_parser("manage.py", comando)
+        return any("--database" in acao.option_strings for acao in parser._actions)
@@ -0,0 +1,312 @@
+# pedidos/metricas.py
+"""
+Tempo de preparo da cozinha: quantis por hora/produto e tamanho da fila.
+
+O tempo de preparo de um pedido vai do início (impresso_em da comanda, ou
+criado_em se não houver comanda) até finalizado_em. Em vez de ordenar todos os
+pedidos concluídos a cada acesso, cada hora fechada é consolidada uma única vez
+em TempoPreparoHora com um SketchTempo (histograma logarítmico mesclável);
+períodos maiores são respondidos somando sketches.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import ComandaCozinha, Pedido, PedidoItem, Produto, TempoPreparoHora
+
+QUANTIS = (0.5, 0.9, 0.99)
+
+
+class SketchTempo:
+    """
+    Sketch de quantis no estilo DDSketch: cada valor cai num bucket
+    logarítmico, com erro relativo de no máximo ALFA. Dois sketches se
+    mesclam somando os contadores, então o rollup pode ser feito por hora e
+    combinado depois sem perder precisão.
+    """
+    ALFA = 0.01
+    GAMA = (1 + ALFA) / (1 - ALFA)
+    MINIMO = 1.0  # segundos; abaixo disso conta como zero
+
+    def __init__(self, bins=None, zeros=0):
+        self.bins = defaultdict(int, bins or {})
+        self.zeros = zeros
+
+    @property
+    def total(self):
+        return self.zeros + sum(self.bins.values())
+
+    def adicionar(self, segundos):
+        if segundos < self.MINIMO:
+            self.zeros += 1
+        else:
+            self.bins[math.ceil(math.log(segundos, self.GAMA))] += 1
+
+    def mesclar(self, outro):
+        self.zeros += outro.zeros
+        for idx, qtd in outro.bins.items():
+            self.bins[idx] += qtd
+        return self
+
+    def quantil(self, q):
+        total = self.total
+        if not total:
+            return None
+        alvo = q * (total - 1)
+        acumulado = self.zeros
+        if alvo < acumulado:
+            return 0.0
+        for idx in sorted(self.bins):
+            acumulado += self.bins[idx]
+            if alvo < acumulado:
+                return 2 * self.GAMA ** idx / (self.GAMA + 1)
+        return 2 * self.GAMA ** max(self.bins) / (self.GAMA + 1)
+
+    def como_dict(self):
+        return {"zeros": self.zeros, "bins": {str(k): v for k, v in self.bins.items()}}
+
+    @classmethod
+    def de_dict(cls, dados):
+        dados = dados or {}
+        return cls({int(k): v for k, v in dados.get("bins", {}).items()}, dados.get("zeros", 0))
+
+
+def _hora(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _sketches(desde, ate):
+    """
+    Percorre (em streaming) os pedidos concluídos em [desde, ate) e devolve
+    sketches por hora de conclusão: (geral, por_produto) com chaves
+    hora e (hora, produto_id), mais a soma de segundos de cada chave.
+    """
+    geral = defaultdict(SketchTempo)
+    por_produto = defaultdict(SketchTempo)
+    somas = defaultdict(float)
+
+    pedidos = (
+        Pedido.objects
+        .filter(status=Pedido.Status.CONCLUIDO, finalizado_em__gte=desde, finalizado_em__lt=ate)
+        .annotate(inicio=Coalesce("comanda__impresso_em", "criado_em"))
+        .values_list("inicio", "finalizado_em")
+        .order_by()
+    )
+    for inicio, fim in pedidos.iterator():
+        segundos = max((fim - inicio).total_seconds(), 0)
+        hora = _hora(fim)
+        geral[hora].adicionar(segundos)
+        somas[hora] += segundos
+
+    itens = (
+        PedidoItem.objects
+        .filter(
+            pedido__status=Pedido.Status.CONCLUIDO,
+            pedido__finalizado_em__gte=desde,
+            pedido__finalizado_em__lt=ate,
+        )
+        .annotate(inicio=Coalesce("pedido__comanda__impresso_em", "pedido__criado_em"))
+        .values_list("produto_id", "inicio", "pedido__finalizado_em")
+        .order_by()
+    )
+    for produto_id, inicio, fim in itens.iterator():
+        segundos = max((fim - inicio).total_seconds(), 0)
+        chave = (_hora(fim), produto_id)
+        por_produto[chave].adicionar(segundos)
+        somas[chave] += segundos
+
+    return geral, por_produto, somas
+
+
+def _filas_por_hora(desde, ate):
+    """
+    Tamanho da fila (comandas ainda abertas) ao fim de cada hora de [desde, ate).
+    Parte da fila no instante `desde` e aplica entradas (impresso_em) e saídas
+    (finalizado_em; atualizado_em para cancelados) agregadas por hora.
+    """
+    saiu_antes = (
+        Q(pedido__status=Pedido.Status.CONCLUIDO, pedido__finalizado_em__lt=desde)
+        | Q(pedido__status=Pedido.Status.CANCELADO, pedido__atualizado_em__lt=desde)
+    )
+    fila = ComandaCozinha.objects.filter(impresso_em__lt=desde).exclude(saiu_antes).count()
+
+    entradas = dict(
+        ComandaCozinha.objects
+        .filter(impresso_em__gte=desde, impresso_em__lt=ate)
+        .annotate(h=TruncHour("impresso_em"))
+        .values_list("h")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    concluidos = (
+        ComandaCozinha.objects
+        .filter(pedido__status=Pedido.Status.CONCLUIDO,
+                pedido__finalizado_em__gte=desde, pedido__finalizado_em__lt=ate)
+        .annotate(h=TruncHour("pedido__finalizado_em"))
+    )
+    cancelados = (
+        ComandaCozinha.objects
+        .filter(pedido__status=Pedido.Status.CANCELADO,
+                pedido__atualizado_em__gte=desde, pedido__atualizado_em__lt=ate)
+        .annotate(h=TruncHour("pedido__atualizado_em"))
+    )
+    saidas = defaultdict(int)
+    for qs in (concluidos, cancelados):
+        for h, n in qs.values_list("h").annotate(n=Count("id")).order_by():
+            saidas[h] += n
+
+    filas = {}
+    hora = desde
+    while hora < ate:
+        fila += entradas.get(hora, 0) - saidas.get(hora, 0)
+        filas[hora] = max(fila, 0)
+        hora += timedelta(hours=1)
+    return filas
+
+
+def consolidar(desde=None, ate=None):
+    """
+    Consolida em TempoPreparoHora as horas fechadas ainda não processadas
+    (ou refaz a partir de `desde`). Devolve o número de horas processadas.
+    """
+    ate = _hora(ate or timezone.now())
+    if desde is None:
+        ultima = TempoPreparoHora.objects.filter(produto__isnull=True).aggregate(h=Max("hora"))["h"]
+        if ultima:
+            desde = ultima + timedelta(hours=1)
+        else:
+            primeiro = Pedido.objects.aggregate(h=Min("criado_em"))["h"]
+            if primeiro is None:
+                return 0
+            desde = primeiro
+    desde = _hora(desde)
+    if desde >= ate:
+        return 0
+
+    geral, por_produto, somas = _sketches(desde, ate)
+    filas = _filas_por_hora(desde, ate)
+
+    linhas = [
+        TempoPreparoHora(
+            hora=hora,
+            pedidos=geral[hora].total if hora in geral else 0,
+            soma_segundos=somas.get(hora, 0),
+            sketch=geral[hora].como_dict() if hora in geral else {},
+            fila=fila,
+        )
+        for hora, fila in filas.items()
+        if fila or hora in geral  # horas vazias não geram linha
+    ]
+    linhas += [
+        TempoPreparoHora(
+            hora=hora,
+            produto_id=produto_id,
+            pedidos=sk.total,
+            soma_segundos=somas[(hora, produto_id)],
+            sketch=sk.como_dict(),
+        )
+        for (hora, produto_id), sk in por_produto.items()
+    ]
+
+    with transaction.atomic(using=router.db_for_write(TempoPreparoHora)):
+        TempoPreparoHora.objects.filter(hora__gte=desde, hora__lt=ate).delete()
+        TempoPreparoHora.objects.bulk_create(linhas, batch_size=500)
+    return len(filas)
+
+
+def _minutos(segundos):
+    return None if segundos is None else segundos / 60
+
+
+def _resumo(sketch, pedidos, soma):
+    """Contagem, média e quantis (em minutos) de um sketch."""
+    return {
+        "pedidos": pedidos,
+        "media": _minutos(soma / pedidos) if pedidos else None,
+        **{f"p{round(q * 100)}": _minutos(sketch.quantil(q)) for q in QUANTIS},
+    }
+
+
+def _ultima_consolidada():
+    return TempoPreparoHora.objects.filter(produto__isnull=True).aggregate(h=Max("hora"))["h"]
+
+
+def resumo_periodo(desde, ate=None):
+    """
+    Quantis de preparo em [desde, ate): por hora, por produto e no período todo.
+    Horas fechadas vêm do rollup; o que ainda não foi consolidado (a hora
+    corrente, ou mais se o serviço `rollup` atrasou) é calculado na hora.
+    A leitura não consolida: isso fica com consolidar_tempos_cozinha, para que
+    um GET nunca pegue a trava de escrita.
+    """
+    agora = timezone.now()
+    ate = ate or agora
+    desde = _hora(desde)
+    ultima = _ultima_consolidada()
+    corte = min(ate, ultima + timedelta(hours=1)) if ultima else desde
+    corte = max(corte, desde)
+
+    horas = {}
+    produtos = {}
+    nomes = {}
+    total = SketchTempo()
+    total_pedidos, total_soma = 0, 0.0
+
+    rollup = (
+        TempoPreparoHora.objects
+        .filter(hora__gte=desde, hora__lt=corte)
+        .values_list("hora", "produto_id", "produto__nome", "pedidos", "soma_segundos", "sketch", "fila")
+    )
+    for hora, produto_id, nome, pedidos, soma, dados, fila in rollup.iterator():
+        sk = SketchTempo.de_dict(dados)
+        if produto_id is None:
+            horas[hora] = [sk, pedidos, soma, fila]
+            total.mesclar(sk)
+            total_pedidos += pedidos
+            total_soma += soma
+        else:
+            nomes[produto_id] = nome
+            atual = produtos.setdefault(produto_id, [SketchTempo(), 0, 0.0])
+            atual[0].mesclar(sk)
+            atual[1] += pedidos
+            atual[2] += soma
+
+    if corte < ate:
+        geral, por_produto, somas = _sketches(corte, ate)
+        abertas = Pedido.objects.filter(status=Pedido.Status.ENVIADO_COZINHA, comanda__isnull=False).count()
+        for hora, sk in geral.items():
+            horas[hora] = [sk, sk.total, somas[hora], abertas if hora == _hora(agora) else None]
+            total.mesclar(sk)
+            total_pedidos += sk.total
+            total_soma += somas[hora]
+        for (hora, produto_id), sk in por_produto.items():
+            atual = produtos.setdefault(produto_id, [SketchTempo(), 0, 0.0])
+            atual[0].mesclar(sk)
+            atual[1] += sk.total
+            atual[2] += somas[(hora, produto_id)]
+        faltando = set(produtos) - set(nomes)
+        if faltando:
+            nomes.update(Produto.objects.filter(pk__in=faltando).values_list("id", "nome"))
+
+    return {
+        "total": _resumo(total, total_pedidos, total_soma),
+        "por_hora": [
+            {"hora": hora, "fila": fila, **_resumo(sk, pedidos, soma)}
+            for hora, (sk, pedidos, soma, fila) in sorted(horas.items())
+        ],
+        "por_produto": sorted(
+            ({"produto_id": pid, "nome": nomes.get(pid, ""), **_resumo(sk, pedidos, soma)}
+             for pid, (sk, pedidos, soma) in produtos.items()),
+            key=lambda r: r["nome"],
+        ),
+    }
+
+
+def sla_ao_vivo(horas=1):
+    """Quantis da(s) última(s) hora(s) para o painel da cozinha."""
+    return resumo_periodo(timezone.now() - timedelta(hours=horas))["total"]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0002_pedido_finalizado_em'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TempoPreparoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('soma_segundos', models.FloatField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+                ('fila', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['hora'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tempopreparohora',
+            name='produto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='pedidos.produto'),
+        ),
+        migrations.AddConstraint(
+            model_name='tempopreparohora',
+            constraint=models.UniqueConstraint(fields=('hora', 'produto'), name='tempo_preparo_hora_produto_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tempopreparohora',
+            constraint=models.UniqueConstraint(condition=models.Q(('produto__isnull', True)), fields=('hora',), name='tempo_preparo_hora_geral_uniq'),
+        ),
+    ]
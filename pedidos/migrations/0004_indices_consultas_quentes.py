@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:56
+
+# Índices apontados por `manage.py analisar_indices --semear 50000` (SQLite 3.40,
+# mediana de 10 execuções, antes -> depois desta migração):
+#   home: pedidos de hoje ........... 8.99 ms -> 0.31 ms  (faixa de criado_em; com __date: 269 ms)
+#   home: concluídos hoje ........... 8.72 ms -> 0.88 ms
+#   home: faturamento de hoje ....... 8.47 ms -> 0.67 ms
+#   home: últimos pedidos ........... 8.51 ms -> 0.59 ms
+#   cozinha: comandas abertas ...... 20.28 ms -> 16.76 ms (500 abertas; resta só o sort delas)
+#   gerar_numero (faixa) ............ 0.53 ms -> 0.42 ms  (com startswith: 5.89 ms)
+#   metricas: concluídos na hora .... 6.80 ms -> 0.76 ms
+#   metricas: fila aberta ........... 4.55 ms -> 1.63 ms
+#   cancelar: saídas do pedido ...... 0.94 ms -> 0.71 ms
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0003_tempo_preparo_hora'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comandacozinha',
+            index=models.Index(fields=['impresso_em'], name='pedidos_com_impress_dd89ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoestoque',
+            index=models.Index(fields=['tipo', 'produto', 'criado_em'], name='pedidos_mov_tipo_c693cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentoestoque',
+            index=models.Index(fields=['pedido', 'tipo', 'produto'], name='pedidos_mov_pedido__32b20c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['criado_em'], name='pedidos_ped_criado__3747eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('status', 'ENVC')), fields=['criado_em'], name='pedido_aberto_cozinha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('finalizado_em__isnull', False)), fields=['status', 'finalizado_em'], name='pedido_finalizado_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0004_indices_consultas_quentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64)),
+                ('operacao', models.CharField(choices=[('CONFIRMAR', 'Confirmar'), ('CONCLUIR', 'Concluir'), ('CANCELAR', 'Cancelar')], max_length=10)),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('expira_em', models.DateTimeField()),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pedidos.pedido')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expira_em'], name='pedidos_cha_expira__c323ec_idx')],
+                'constraints': [models.UniqueConstraint(fields=('chave', 'operacao', 'pedido'), name='chave_idempotencia_uniq')],
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models, transaction
+from django.db import models, router, transaction
 from django.db.models import Sum, F
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -34,6 +34,20 @@ class Pedido(models.Model):
 
     class Meta:
         ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["criado_em"]),
+            # parciais: só as linhas que as telas quentes realmente buscam
+            models.Index(
+                fields=["criado_em"],
+                condition=models.Q(status="ENVC"),
+                name="pedido_aberto_cozinha_idx",
+            ),
+            models.Index(
+                fields=["status", "finalizado_em"],
+                condition=models.Q(finalizado_em__isnull=False),
+                name="pedido_finalizado_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.numero or '(sem número)'} - {self.nome_cliente}"
@@ -41,7 +55,12 @@ class Pedido(models.Model):
     def gerar_numero(self):
         hoje = timezone.localdate().strftime("%Y%m%d")
         base = f"{hoje}-"
-        ultimo = Pedido.objects.filter(numero__startswith=base).order_by("numero").last()
+        # faixa em vez de startswith: o LIKE do SQLite não usa o índice único de numero
+        ultimo = (
+            Pedido.objects.filter(numero__gte=base, numero__lt=f"{hoje}.")  # "." vem logo após "-"
+            .order_by("-numero")
+            .first()
+        )
         seq = int(ultimo.numero.split("-")[1]) + 1 if ultimo else 1
         return f"{base}{seq:04d}"
 
@@ -66,14 +85,66 @@ class PedidoItem(models.Model):
     class Meta:
         unique_together = [("pedido", "produto")]  # evita duplicado do mesmo produto no pedido
 
+    @property
+    def subtotal(self):
+        return self.quantidade * self.preco_unitario
+
     def clean(self):
         if self.quantidade <= 0:
             raise ValidationError("Quantidade deve ser positiva.")
         # validação branda aqui; checagem dura acontece na função de confirmação com lock
 
+    # Pedido.total é mantido aqui, na mesma transação da escrita do item, para
+    # que as telas só leiam. Escritas em massa (QuerySet.update/delete) não
+    # passam por aqui; `manage.py reconciliar_totais` corrige esses casos.
+    def _banco(self, using=None):
+        return using or router.db_for_write(PedidoItem, instance=self)
+
+    def save(self, *args, **kwargs):
+        db = self._banco(kwargs.get("using"))
+        with transaction.atomic(using=db):
+            anterior = None
+            if not self._state.adding:
+                anterior = (
+                    PedidoItem.objects.using(db).filter(pk=self.pk)
+                    .values_list("pedido_id", "quantidade", "preco_unitario")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            delta = self.subtotal
+            if anterior:
+                pedido_anterior, quantidade, preco = anterior
+                if pedido_anterior == self.pedido_id:
+                    delta -= quantidade * preco
+                else:
+                    _somar_ao_total(db, pedido_anterior, -quantidade * preco)
+            _somar_ao_total(db, self.pedido_id, delta)
+
+    def delete(self, *args, **kwargs):
+        db = self._banco(kwargs.get("using"))
+        with transaction.atomic(using=db):
+            # valores gravados, não os da instância: o formset inline aplica o
+            # POST (ex.: quantidade nova) no item antes de apagá-lo
+            gravado = (
+                PedidoItem.objects.using(db).filter(pk=self.pk)
+                .values_list("pedido_id", "quantidade", "preco_unitario")
+                .first()
+            )
+            resultado = super().delete(*args, **kwargs)
+            if gravado:
+                pedido_id, quantidade, preco = gravado
+                _somar_ao_total(db, pedido_id, -quantidade * preco)
+        return resultado
+
     def __str__(self):
         return f"{self.quantidade} x {self.produto.nome}"
 
+def _somar_ao_total(db, pedido_id, delta):
+    # atualizado_em muda mesmo com delta zero: é o validador (ETag) do detalhe
+    Pedido.objects.using(db).filter(pk=pedido_id).update(
+        total=F("total") + delta, atualizado_em=timezone.now()
+    )
+
 class MovimentoEstoque(models.Model):
     class Tipo(models.TextChoices):
         SAIDA = "SAIDA", "Saída"
@@ -90,12 +161,73 @@ class MovimentoEstoque(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["tipo", "produto", "criado_em"]),
-            models.Index(fields=["pedido"]),
+            models.Index(fields=["pedido", "tipo", "produto"]),
         ]
 
 class ComandaCozinha(models.Model):
     pedido = models.OneToOneField(Pedido, related_name="comanda", on_delete=models.CASCADE)
     impresso_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["impresso_em"]),
+        ]
+
     def __str__(self):
         return f"Comanda {self.pedido.numero} - {self.pedido.nome_cliente}"
+
+class TempoPreparoHora(models.Model):
+    """
+    Rollup horário do tempo de preparo na cozinha (início -> finalizado_em).
+    `sketch` guarda um histograma de quantis mesclável (ver pedidos.metricas);
+    linhas com produto nulo consolidam todos os pedidos da hora e trazem a fila.
+    """
+    hora = models.DateTimeField()
+    produto = models.ForeignKey(Produto, null=True, blank=True, on_delete=models.CASCADE)
+    pedidos = models.PositiveIntegerField(default=0)
+    soma_segundos = models.FloatField(default=0)
+    sketch = models.JSONField(default=dict)
+    fila = models.PositiveIntegerField(null=True, blank=True)  # comandas abertas ao fim da hora
+
+    class Meta:
+        ordering = ["hora"]
+        constraints = [
+            models.UniqueConstraint(fields=["hora", "produto"], name="tempo_preparo_hora_produto_uniq"),
+            models.UniqueConstraint(
+                fields=["hora"],
+                condition=models.Q(produto__isnull=True),
+                name="tempo_preparo_hora_geral_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        alvo = self.produto.nome if self.produto_id else "todos"
+        return f"{self.hora:%Y-%m-%d %H}h - {alvo} ({self.pedidos} pedidos)"
+
+class ChaveIdempotencia(models.Model):
+    """
+    Resultado de uma operação de pedido já executada com uma chave de
+    idempotência (ver services.idempotente). `erro` vazio = sucesso.
+    """
+    class Operacao(models.TextChoices):
+        CONFIRMAR = "CONFIRMAR", "Confirmar"
+        CONCLUIR = "CONCLUIR", "Concluir"
+        CANCELAR = "CANCELAR", "Cancelar"
+
+    chave = models.CharField(max_length=64)
+    operacao = models.CharField(max_length=10, choices=Operacao.choices)
+    pedido = models.ForeignKey(Pedido, related_name="+", on_delete=models.CASCADE)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    expira_em = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["chave", "operacao", "pedido"], name="chave_idempotencia_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["expira_em"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_operacao_display()} {self.pedido_id} ({self.chave})"
@@ -1,10 +1,91 @@
-from django.db import transaction
-from django.db.models import F
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
 from django.core.exceptions import ValidationError
-from .models import Pedido, Produto, MovimentoEstoque, ComandaCozinha
+from .models import Pedido, Produto, MovimentoEstoque, ComandaCozinha, ChaveIdempotencia
 from django.utils import timezone
 
-@transaction.atomic
+# por quanto tempo uma chave de idempotência responde com o resultado guardado
+IDEMPOTENCIA_TTL = timedelta(seconds=getattr(settings, "IDEMPOTENCIA_TTL", 10 * 60))
+
+
+def atomic_da_loja(func):
+    """
+    Como @transaction.atomic, mas no banco da loja ativa (cantina.lojas),
+    resolvido a cada chamada e não na importação do módulo.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with transaction.atomic(using=router.db_for_write(Pedido)):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _digest(chave):
+    # chaves do cliente têm tamanho livre: truncar faria chaves longas com o
+    # mesmo prefixo colidirem; o sha256 cabe nos 64 caracteres do campo
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+
+def _registro_valido(filtro):
+    return ChaveIdempotencia.objects.filter(**filtro, expira_em__gt=timezone.now()).first()
+
+
+def idempotente(operacao):
+    """
+    Aceita `chave=` na operação: repetições com a mesma chave para o mesmo
+    pedido (duplo toque, reenvio do navegador) recebem o resultado guardado,
+    sucesso ou ValidationError, sem travar Produto nem consultar o razão.
+    Sem chave, a operação roda normalmente.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(pedido_id, *, chave=None):
+            if not chave:
+                return func(pedido_id)
+
+            filtro = {"chave": _digest(chave), "operacao": operacao, "pedido_id": pedido_id}
+            registro = _registro_valido(filtro)
+            if registro is None:
+                try:
+                    with transaction.atomic(using=router.db_for_write(ChaveIdempotencia)):
+                        # de novo, já com a trava: um duplicado concorrente (duplo toque)
+                        # esperou a primeira requisição terminar e agora enxerga o resultado.
+                        # No SQLite o BEGIN IMMEDIATE já serializa; nos demais, o lock do pedido.
+                        list(Pedido.objects.select_for_update().filter(pk=pedido_id).values_list("pk"))
+                        registro = _registro_valido(filtro)
+                        if registro is None:
+                            ChaveIdempotencia.objects.filter(expira_em__lte=timezone.now()).delete()
+                            pedido = func(pedido_id)
+                            ChaveIdempotencia.objects.create(**filtro, expira_em=timezone.now() + IDEMPOTENCIA_TTL)
+                            return pedido
+                except ValidationError as e:
+                    try:
+                        with transaction.atomic(using=router.db_for_write(ChaveIdempotencia)):
+                            ChaveIdempotencia.objects.create(
+                                **filtro, erro="\n".join(e.messages), expira_em=timezone.now() + IDEMPOTENCIA_TTL
+                            )
+                    except IntegrityError:
+                        pass  # outra requisição com a mesma chave já gravou o resultado
+                    raise
+                except IntegrityError:
+                    # corrida: a mesma chave terminou em outra requisição primeiro
+                    registro = ChaveIdempotencia.objects.filter(**filtro).first()
+                    if registro is None:
+                        raise
+
+            if registro.erro:
+                raise ValidationError(registro.erro.split("\n"))
+            return Pedido.objects.get(pk=pedido_id)
+        return wrapper
+    return decorator
+
+
+@idempotente(ChaveIdempotencia.Operacao.CONCLUIR)
+@atomic_da_loja
 def concluir_pedido(pedido_id: int) -> Pedido:
     pedido = Pedido.objects.select_for_update().get(pk=pedido_id)
     if pedido.status != Pedido.Status.ENVIADO_COZINHA:
@@ -15,7 +96,8 @@ def concluir_pedido(pedido_id: int) -> Pedido:
     return pedido
 
 
-@transaction.atomic
+@idempotente(ChaveIdempotencia.Operacao.CONFIRMAR)
+@atomic_da_loja
 def confirmar_pedido(pedido_id: int) -> Pedido:
     pedido = (
         Pedido.objects.select_for_update()
@@ -24,6 +106,10 @@ def confirmar_pedido(pedido_id: int) -> Pedido:
         .get(pk=pedido_id)
     )
 
+    # repetição com outra chave (ou sem chave) não pode baixar o estoque de novo
+    if pedido.status != Pedido.Status.RASCUNHO:
+        raise ValidationError("Apenas pedidos em rascunho podem ser confirmados.")
+
     if not pedido.itens.exists():
         raise ValidationError("Pedido sem itens.")
 
@@ -49,14 +135,15 @@ def confirmar_pedido(pedido_id: int) -> Pedido:
             quantidade=item.quantidade,
         )
 
-    pedido.recalcular_total()
+    # total já é mantido pelas escritas dos itens (PedidoItem.save/delete)
     pedido.status = Pedido.Status.ENVIADO_COZINHA
-    pedido.save(update_fields=["status", "total", "atualizado_em"])
+    pedido.save(update_fields=["status", "atualizado_em"])
 
     ComandaCozinha.objects.get_or_create(pedido=pedido)
     return pedido
 
-@transaction.atomic
+@idempotente(ChaveIdempotencia.Operacao.CANCELAR)
+@atomic_da_loja
 def cancelar_pedido(pedido_id: int) -> Pedido:
     pedido = (
         Pedido.objects.select_for_update()
@@ -0,0 +1,134 @@
+# pedidos/shortcuts.py
+"""
+Atalhos para as views assíncronas (ASGI).
+
+O ORM é usado pela API assíncrona (acount, aaggregate, async for) nas views;
+já o render continua síncrono porque os context processors (widget de estoque,
+mensagens na sessão) consultam o banco, então ele roda numa thread.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+arender = sync_to_async(render)
+
+# relatórios em cache ficam válidos até a próxima alteração do razão (ver
+# pedidos/signals.py); o TTL é só uma rede de segurança
+RELATORIO_CACHE_TTL = getattr(settings, "RELATORIO_CACHE_TTL", 60)
+
+
+def _chave_versao(nome):
+    return f"versao:{nome}"
+
+
+async def aversao(nome):
+    """
+    Versão atual de `nome` (ex.: o razão de estoque), guardada no cache. Se a
+    chave sumiu (clear, LRU), recomeça num valor derivado do relógio, nunca
+    num número já usado por uma ETag antiga.
+    """
+    chave = _chave_versao(nome)
+    versao = await cache.aget(chave)
+    if versao is None:
+        await cache.aadd(chave, time.time_ns(), None)
+        versao = await cache.aget(chave)
+    return versao
+
+
+def avancar_versao(nome):
+    chave = _chave_versao(nome)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.add(chave, time.time_ns(), None)
+
+
+async def apaginar(qs, numero, por_pagina=25, chave_cache=None):
+    """
+    Equivalente assíncrono de Paginator(qs).get_page(numero) com a página já
+    materializada. Com `chave_cache`, a contagem e as linhas da página vêm do
+    cache (e vão para ele), sem reexecutar a consulta.
+    """
+    paginator = Paginator(qs, por_pagina)
+    if chave_cache:
+        guardado = await cache.aget(chave_cache)
+        if guardado is not None:
+            paginator.count, linhas = guardado
+            page_obj = paginator.get_page(numero)
+            page_obj.object_list = linhas
+            return page_obj
+
+    paginator.count = await qs.acount()  # evita o COUNT síncrono do cached_property
+    page_obj = paginator.get_page(numero)
+    page_obj.object_list = [row async for row in page_obj.object_list]
+    if chave_cache:
+        await cache.aset(chave_cache, (paginator.count, page_obj.object_list), RELATORIO_CACHE_TTL)
+    return page_obj
+
+
+def querystring_normalizada(request):
+    """GET ordenado e sem parâmetros vazios: filtros equivalentes geram a mesma chave."""
+    return urlencode(sorted((k, v) for k, v in request.GET.items() if v))
+
+
+def chave_relatorio(nome, versao, request, *partes):
+    qs = hashlib.sha1(querystring_normalizada(request).encode()).hexdigest()[:16]
+    return ":".join(["relatorio", nome, str(versao), *map(str, partes), qs])
+
+
+def _tem_mensagens(request):
+    # len() carrega as mensagens sem marcá-las como lidas
+    return bool(len(messages.get_messages(request)))
+
+
+def _etag(request, versao):
+    if versao is None:
+        return None
+    # as páginas trazem o token CSRF; se o segredo mudar, a cópia do cliente não serve
+    csrf = request.META.get("CSRF_COOKIE") or ""
+    return quote_etag(f"{versao}-{hashlib.sha1(csrf.encode()).hexdigest()[:8]}")
+
+
+def condicional(validadores):
+    """
+    GET condicional para views assíncronas, no espírito de
+    django.views.decorators.http.condition (cujos etag_func/last_modified_func
+    são síncronos e não podem usar o ORM dentro do event loop).
+
+    `validadores(request, *args, **kwargs)` é async e devolve (etag,
+    last_modified) a partir de metadados baratos. Se o cliente já tem essa
+    versão, responde 304 sem executar a view.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # com mensagens pendentes a página precisa ser gerada para exibi-las
+            if request.method not in ("GET", "HEAD") or await sync_to_async(_tem_mensagens)(request):
+                return await view(request, *args, **kwargs)
+
+            versao, last_modified = await validadores(request, *args, **kwargs)
+            etag = _etag(request, versao)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                etag = _etag(request, versao)  # o render pode ter criado o cookie CSRF
+            if etag:
+                response.headers.setdefault("ETag", etag)
+            if timestamp:
+                response.headers.setdefault("Last-Modified", http_date(timestamp))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,49 @@
+# pedidos/signals.py
+"""
+Versão do razão de estoque para as ETags e o cache dos relatórios.
+
+Os relatórios mostram movimentos com o nome do produto e o número/cliente do
+pedido, então qualquer escrita nessas tabelas (inclusive edição ou exclusão
+pelo admin, e o SET_NULL em MovimentoEstoque.pedido quando um pedido é
+apagado) avança a versão. O avanço espera o COMMIT: antes dele um leitor ainda
+veria os dados antigos e os guardaria sob a versão nova.
+
+Escritas em massa (QuerySet.update, bulk_create) não disparam sinais.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import MovimentoEstoque, Pedido, Produto
+from .shortcuts import avancar_versao
+
+VERSAO_RAZAO = "razao-estoque"
+
+# campos que aparecem nos relatórios; salvar só outros (estoque, status) não conta
+CAMPOS_VISIVEIS = {
+    Produto: {"nome"},
+    Pedido: {"numero", "nome_cliente"},
+}
+
+
+def _avancar(using):
+    transaction.on_commit(partial(avancar_versao, VERSAO_RAZAO), using=using)
+
+
+@receiver(post_save, sender=MovimentoEstoque)
+@receiver(post_delete, sender=MovimentoEstoque)
+@receiver(post_delete, sender=Produto)
+@receiver(post_delete, sender=Pedido)
+def razao_alterado(sender, using, **kwargs):
+    _avancar(using)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_save, sender=Pedido)
+def cadastro_salvo(sender, using, created, update_fields=None, **kwargs):
+    if created:
+        return  # ainda não tem movimentos
+    if update_fields is None or CAMPOS_VISIVEIS[sender] & set(update_fields):
+        _avancar(using)
@@ -1,3 +1,247 @@
-from django.test import TestCase
+import re
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .agendador import AgendadorConfirmacoes, aguardar
+from .metricas import resumo_periodo
+from .models import MovimentoEstoque, Pedido, PedidoItem, Produto, TempoPreparoHora
+from .services import concluir_pedido, confirmar_pedido
+
+
+class TotalPedidoTests(TestCase):
+    """Pedido.total acompanha as escritas de PedidoItem (save/delete)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = Produto.objects.create(nome="Pastel", preco=Decimal("3.00"), estoque=100)
+
+    def _total(self, pedido):
+        pedido.refresh_from_db(fields=["total"])
+        return pedido.total
+
+    def test_criar_alterar_mover_e_apagar(self):
+        a = Pedido.objects.create(nome_cliente="A")
+        b = Pedido.objects.create(nome_cliente="B")
+
+        item = PedidoItem.objects.create(pedido=a, produto=self.produto, quantidade=2,
+                                         preco_unitario=Decimal("3.00"))
+        self.assertEqual(self._total(a), Decimal("6.00"))
+
+        item.quantidade = 5
+        item.save()
+        self.assertEqual(self._total(a), Decimal("15.00"))
+
+        item.pedido = b
+        item.save()
+        self.assertEqual(self._total(a), Decimal("0.00"))
+        self.assertEqual(self._total(b), Decimal("15.00"))
+
+        item.delete()
+        self.assertEqual(self._total(b), Decimal("0.00"))
+
+    def test_apagar_usa_valores_gravados(self):
+        # formset inline: quantidade alterada e DELETE marcados no mesmo envio
+        pedido = Pedido.objects.create(nome_cliente="A")
+        item = PedidoItem.objects.create(pedido=pedido, produto=self.produto, quantidade=2,
+                                         preco_unitario=Decimal("3.00"))
+        item.quantidade = 7
+        item.delete()
+        self.assertEqual(self._total(pedido), Decimal("0.00"))
+        self.assertFalse(PedidoItem.objects.filter(pedido=pedido).exists())
+
+    def test_reconciliar_totais_corrige_divergencia(self):
+        pedido = Pedido.objects.create(nome_cliente="A")
+        PedidoItem.objects.create(pedido=pedido, produto=self.produto, quantidade=3,
+                                  preco_unitario=Decimal("3.00"))
+        Pedido.objects.filter(pk=pedido.pk).update(total=Decimal("1.00"))  # não passa pelo save
+
+        with mock.patch("pedidos.management.commands.reconciliar_totais.transaction.atomic") as atomic:
+            call_command("reconciliar_totais", "--simular", stdout=StringIO())
+        atomic.assert_not_called()  # só leitura: não pega a trava de escrita
+        self.assertEqual(self._total(pedido), Decimal("1.00"))
+
+        call_command("reconciliar_totais", stdout=StringIO())
+        self.assertEqual(self._total(pedido), Decimal("9.00"))
+
+
+class ConfirmarPedidoTests(TestCase):
+    def test_segunda_confirmacao_nao_baixa_estoque_de_novo(self):
+        produto = Produto.objects.create(nome="Suco", preco=Decimal("4.00"), estoque=10)
+        pedido = Pedido.objects.create(nome_cliente="A")
+        PedidoItem.objects.create(pedido=pedido, produto=produto, quantidade=2, preco_unitario=Decimal("4.00"))
+
+        confirmar_pedido(pedido.pk, chave="a")
+        with self.assertRaises(ValidationError):
+            confirmar_pedido(pedido.pk, chave="b")
+        with self.assertRaises(ValidationError):
+            confirmar_pedido(pedido.pk)
+
+        produto.refresh_from_db()
+        self.assertEqual(produto.estoque, 8)
+        self.assertEqual(MovimentoEstoque.objects.filter(pedido=pedido, tipo=MovimentoEstoque.Tipo.SAIDA).count(), 1)
+
+    def test_chaves_longas_com_mesmo_prefixo_nao_colidem(self):
+        produto = Produto.objects.create(nome="Bolo", preco=Decimal("5.00"), estoque=0)
+        pedido = Pedido.objects.create(nome_cliente="B")
+        PedidoItem.objects.create(pedido=pedido, produto=produto, quantidade=1, preco_unitario=Decimal("5.00"))
+        prefixo = "x" * 64
+
+        with self.assertRaises(ValidationError):
+            confirmar_pedido(pedido.pk, chave=prefixo + "1")  # sem estoque: erro guardado na chave
+        produto.estoque = 5
+        produto.save()
+        confirmar_pedido(pedido.pk, chave=prefixo + "2")  # outra chave, não repete o erro
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, Pedido.Status.ENVIADO_COZINHA)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class VersaoRelatorioTests(TestCase):
+    def _etag(self):
+        return self.client.get(reverse("pedidos:saidas-por-produto"))["ETag"]
+
+    def test_edicao_e_exclusao_no_razao_mudam_a_etag(self):
+        produto = Produto.objects.create(nome="Café", preco=Decimal("2.00"), estoque=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            movimento = MovimentoEstoque.objects.create(produto=produto, tipo=MovimentoEstoque.Tipo.SAIDA,
+                                                        quantidade=1)
+        inicial = self._etag()
+        self.assertEqual(self._etag(), inicial)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movimento.quantidade = 3
+            movimento.save()
+        editado = self._etag()
+        self.assertNotEqual(editado, inicial)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movimento.delete()
+        self.assertNotEqual(self._etag(), editado)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CozinhaEtagTests(TestCase):
+    def _etag(self):
+        return self.client.get(reverse("pedidos:cozinha"))["ETag"]
+
+    def test_sla_ao_vivo_muda_a_etag(self):
+        produto = Produto.objects.create(nome="Misto", preco=Decimal("6.00"), estoque=10)
+        aberto = Pedido.objects.create(nome_cliente="A")
+        outro = Pedido.objects.create(nome_cliente="B")
+        for pedido in (aberto, outro):
+            PedidoItem.objects.create(pedido=pedido, produto=produto, quantidade=1, preco_unitario=Decimal("6.00"))
+            confirmar_pedido(pedido.pk)
+        inicial = self._etag()
+
+        # concluir tira o pedido da fila e o coloca no SLA
+        concluir_pedido(outro.pk)
+        depois_conclusao = self._etag()
+        self.assertNotEqual(depois_conclusao, inicial)
+
+        # mesma fila e nenhum pedido novo concluído: só a virada do minuto muda a ETag
+        with mock.patch("pedidos.views.timezone.now", return_value=timezone.now() + timedelta(minutes=1)):
+            self.assertNotEqual(self._etag(), depois_conclusao)
+
+
+class RollupAtrasadoTests(TestCase):
+    def test_resumo_le_ao_vivo_as_horas_nao_consolidadas(self):
+        agora = timezone.now()
+        pedido = Pedido.objects.create(nome_cliente="A")
+        Pedido.objects.filter(pk=pedido.pk).update(
+            status=Pedido.Status.CONCLUIDO,
+            criado_em=agora - timedelta(hours=5, minutes=20),
+            finalizado_em=agora - timedelta(hours=5),
+        )
+
+        resumo = resumo_periodo(agora - timedelta(hours=6))
+
+        self.assertEqual(resumo["total"]["pedidos"], 1)
+        self.assertAlmostEqual(resumo["total"]["media"], 20, delta=1)
+        self.assertFalse(TempoPreparoHora.objects.exists())  # GET não grava o rollup
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class DetalheEtagTests(TestCase):
+    CHAVE = re.compile(r'name="chave_idempotencia" value="([^"]*)"')
+
+    def test_pagina_em_cache_nao_repete_confirmacao_que_falhou(self):
+        produto = Produto.objects.create(nome="Torta", preco=Decimal("7.00"), estoque=0)
+        pedido = Pedido.objects.create(nome_cliente="A")
+        PedidoItem.objects.create(pedido=pedido, produto=produto, quantidade=1, preco_unitario=Decimal("7.00"))
+        url = reverse("pedidos:detalhe", args=[pedido.pk])
+
+        pagina = self.client.get(url)
+        chave = self.CHAVE.search(pagina.content.decode())[1]
+        self.assertEqual(chave, "")  # gerada no navegador, no envio
+
+        self.client.post(reverse("pedidos:confirmar", args=[pedido.pk]), {"chave_idempotencia": chave})
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, Pedido.Status.RASCUNHO)
+
+        produto.estoque = 5
+        produto.save()
+        self.client.get(url)  # consome a mensagem de erro do redirect
+        cacheada = self.client.get(url, HTTP_IF_NONE_MATCH=pagina["ETag"])
+        self.assertEqual(cacheada.status_code, 304)
+
+        # o formulário da cópia em cache não carrega uma chave usada antes
+        self.client.post(reverse("pedidos:confirmar", args=[pedido.pk]), {"chave_idempotencia": chave})
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, Pedido.Status.ENVIADO_COZINHA)
+
+
+class AgendadorConfirmacoesTests(TransactionTestCase):
+    def _pedido(self, produto, quantidade=1):
+        pedido = Pedido.objects.create(nome_cliente="Caixa")
+        PedidoItem.objects.create(pedido=pedido, produto=produto, quantidade=quantidade,
+                                  preco_unitario=produto.preco)
+        return pedido
+
+    def test_lote_com_um_pedido_sem_estoque(self):
+        pao = Produto.objects.create(nome="Pão", preco=Decimal("1.00"), estoque=10)
+        esgotado = Produto.objects.create(nome="Esgotado", preco=Decimal("2.00"), estoque=0)
+        ok1, falha, ok2 = self._pedido(pao, 2), self._pedido(esgotado), self._pedido(pao, 3)
+
+        agendador = AgendadorConfirmacoes(janela_ms=300, lote_max=10)
+        futuros = [agendador.enviar(p.pk) for p in (ok1, falha, ok2)]
+
+        self.assertEqual(aguardar(futuros[0]).pk, ok1.pk)
+        with self.assertRaisesMessage(ValidationError, "Estoque insuficiente para Esgotado"):
+            aguardar(futuros[1])
+        self.assertEqual(aguardar(futuros[2]).pk, ok2.pk)
+        self.assertEqual(agendador.lotes, 1)
+
+        status = dict(Pedido.objects.values_list("pk", "status"))
+        self.assertEqual(status[ok1.pk], Pedido.Status.ENVIADO_COZINHA)
+        self.assertEqual(status[falha.pk], Pedido.Status.RASCUNHO)
+        self.assertEqual(status[ok2.pk], Pedido.Status.ENVIADO_COZINHA)
+        pao.refresh_from_db()
+        esgotado.refresh_from_db()
+        self.assertEqual((pao.estoque, esgotado.estoque), (5, 0))
+        self.assertEqual(
+            sorted(MovimentoEstoque.objects.values_list("pedido_id", "quantidade")),
+            sorted([(ok1.pk, 2), (ok2.pk, 3)]),
+        )
+
+    @override_settings(CONFIRMACAO_TIMEOUT=0.2)
+    def test_aguardar_estoura_o_tempo(self):
+        liberar = threading.Event()
+        agendador = AgendadorConfirmacoes(janela_ms=1)
+        with mock.patch("pedidos.agendador.confirmar_pedido", side_effect=lambda *a, **k: liberar.wait(5)):
+            futuro = agendador.enviar(1)
+            try:
+                with self.assertRaisesMessage(ValidationError, "demorou demais"):
+                    aguardar(futuro)
+            finally:
+                liberar.set()
+            futuro.result(timeout=5)  # o lote termina e a thread segue viva
+        self.assertTrue(agendador._thread.is_alive())
@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
 from . import views_estoque
+from . import views_metricas
 
 app_name = "pedidos"
 
@@ -9,6 +10,7 @@ urlpatterns = [
     path("<int:pk>/", views.detalhe_pedido, name="detalhe"),
     path("<int:pk>/confirmar/", views.confirmar_enviar, name="confirmar"),
     path("cozinha/", views.cozinha_painel, name="cozinha"),
+    path("cozinha/tempos/", views_metricas.tempos_cozinha, name="tempos-cozinha"),
     path("<int:pk>/concluir/", views.concluir_pedido_view, name="concluir"),
     path("<int:pk>/cancelar/", views.cancelar_pedido_view, name="cancelar"),
 
@@ -1,6 +1,8 @@
 # views.py
+from datetime import timedelta
 from decimal import Decimal
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.forms import ModelForm, inlineformset_factory
 from django.contrib import messages
 from django.core.exceptions import ValidationError
@@ -8,15 +10,22 @@ from .models import Pedido, PedidoItem, Produto, ComandaCozinha
 
 from decimal import Decimal
 from django.views.decorators.http import require_POST
-from .services import confirmar_pedido, concluir_pedido, cancelar_pedido  
+from .services import concluir_pedido, cancelar_pedido
+from .agendador import confirmar
+from .metricas import sla_ao_vivo
+from .shortcuts import arender, condicional
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Count, Max, Prefetch, Sum
+
+def _chave_idempotencia(request):
+    """Chave enviada pelo formulário (gerada a cada render) ou pelo header Idempotency-Key."""
+    return request.POST.get("chave_idempotencia") or request.headers.get("Idempotency-Key")
 
 @require_POST
 def cancelar_pedido_view(request, pk):
     pedido = get_object_or_404(Pedido, pk=pk)
     try:
-        cancelar_pedido(pedido.id)  # devolve estoque + muda status
+        cancelar_pedido(pedido.id, chave=_chave_idempotencia(request))  # devolve estoque + muda status
         messages.success(request, f"Pedido {pedido.numero} cancelado e estoque restaurado.")
     except ValidationError as e:
         messages.error(request, str(e))
@@ -27,7 +36,7 @@ def cancelar_pedido_view(request, pk):
 def concluir_pedido_view(request, pk):
     pedido = get_object_or_404(Pedido, pk=pk)
     try:
-        concluir_pedido(pedido.id)
+        concluir_pedido(pedido.id, chave=_chave_idempotencia(request))
         messages.success(request, f"Pedido {pedido.numero} concluído!")
     except ValidationError as e:
         messages.error(request, str(e))
@@ -38,31 +47,36 @@ def concluir_pedido_view(request, pk):
     return redirect("pedidos:detalhe", pk=pk)
 
 
-def detalhe_pedido(request, pk):
-    pedido = get_object_or_404(Pedido, pk=pk)
-
-    itens_ctx = []
-    total = Decimal("0.00")
-
-    for it in pedido.itens.select_related("produto"):
-        subtotal = it.preco_unitario * it.quantidade
-        itens_ctx.append({
+async def _validadores_pedido(request, pk):
+    atualizado_em = await Pedido.objects.filter(pk=pk).values_list("atualizado_em", flat=True).afirst()
+    if atualizado_em is None:
+        return None, None  # a view responde 404
+    return f"pedido-{pk}-{atualizado_em.timestamp()}", atualizado_em
+
+@condicional(_validadores_pedido)
+async def detalhe_pedido(request, pk):
+    # somente leitura: Pedido.total é mantido pelas escritas dos itens
+    pedido = await aget_object_or_404(
+        Pedido.objects.prefetch_related(
+            Prefetch("itens", queryset=PedidoItem.objects.select_related("produto"))
+        ),
+        pk=pk,
+    )
+
+    itens_ctx = [
+        {
             "nome": it.produto.nome,
             "qtd": it.quantidade,
             "unit": it.preco_unitario,
-            "subtotal": subtotal,
-        })
-        total += subtotal
+            "subtotal": it.subtotal,
+        }
+        for it in pedido.itens.all()
+    ]
 
-    # se por algum motivo o total estiver divergente, ajusta
-    if pedido.total != total:
-        pedido.total = total
-        pedido.save(update_fields=["total", "atualizado_em"])
-
-    return render(request, "pedidos/detalhe_pedido.html", {
+    return await arender(request, "pedidos/detalhe_pedido.html", {
         "pedido": pedido,
         "itens": itens_ctx,
-        "total": total,
+        "total": pedido.total,
     })
 
 
@@ -91,12 +105,9 @@ def criar_pedido(request):
 
             for it in itens:
                 it.preco_unitario = it.produto.preco  # sempre do produto
-                it.save()
+                it.save()  # já soma o subtotal em pedido.total
             formset.save_m2m()
 
-            # 🔑 já calcula o total agora (antes mesmo de confirmar)
-            pedido.recalcular_total()
-
             messages.success(request, "Pedido criado em rascunho.")
             return redirect("pedidos:detalhe", pk=pedido.pk)
     else:
@@ -114,10 +125,11 @@ def criar_pedido(request):
 #     pedido = get_object_or_404(Pedido, pk=pk)
 #     return render(request, "pedidos/detalhe_pedido.html", {"pedido": pedido})
 
+@require_POST
 def confirmar_enviar(request, pk):
     pedido = get_object_or_404(Pedido, pk=pk)
     try:
-        confirmar_pedido(pedido.id)
+        confirmar(pedido.id, chave=_chave_idempotencia(request))
         messages.success(request, "Pedido confirmado e enviado à cozinha!")
     except ValidationError as e:
         messages.error(request, str(e))
@@ -125,21 +137,42 @@ def confirmar_enviar(request, pk):
     return redirect("home")
     # return redirect("pedidos:detalhe", pk=pk)
 
-def cozinha_painel(request):
+async def _validadores_cozinha(request):
+    # muda quando um pedido entra, sai ou é alterado na fila, quando um pedido é
+    # concluído e a cada minuto: o SLA da página é uma janela móvel da última hora
+    abertos = await Pedido.objects.filter(status=Pedido.Status.ENVIADO_COZINHA).aaggregate(
+        n=Count("id"), ultimo=Max("atualizado_em")
+    )
+    concluido = (await Pedido.objects.filter(status=Pedido.Status.CONCLUIDO).aaggregate(
+        m=Max("finalizado_em")
+    ))["m"]
+    ultimo = abertos["ultimo"].timestamp() if abertos["ultimo"] else 0
+    concluido = concluido.timestamp() if concluido else 0
+    minuto = int(timezone.now().timestamp() // 60)
+    return f"cozinha-{abertos['n']}-{ultimo}-{concluido}-{minuto}", None
+
+
+@condicional(_validadores_cozinha)
+async def cozinha_painel(request):
     # mostra apenas pedidos enviados e não concluídos/cancelados
     comandas = ComandaCozinha.objects.select_related("pedido").filter(
-        pedido__status__in=[Pedido.Status.ENVIADO_COZINHA]
-    ).order_by("impresso_em")
-    return render(request, "pedidos/cozinha.html", {"comandas": comandas})
+        pedido__status=Pedido.Status.ENVIADO_COZINHA
+    ).prefetch_related("pedido__itens__produto").order_by("impresso_em")
+    comandas = [c async for c in comandas]
+    sla = await sync_to_async(sla_ao_vivo)()
+    return await arender(request, "pedidos/cozinha.html", {
+        "comandas": comandas, "sla": sla,
+    })
 
 
-def home(request):
-    hoje = timezone.localdate()
-    qs_hoje = Pedido.objects.filter(criado_em__date=hoje)
+async def home(request):
+    # faixa do dia em vez de criado_em__date, que vira função no SQL e ignora o índice
+    inicio = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    qs_hoje = Pedido.objects.filter(criado_em__gte=inicio, criado_em__lt=inicio + timedelta(days=1))
     resumo = {
-        "hoje_pedidos": qs_hoje.count(),
-        "hoje_concluidos": qs_hoje.filter(status=Pedido.Status.CONCLUIDO).count(),
-        "hoje_total": qs_hoje.aggregate(s=Sum("total"))["s"] or 0,
+        "hoje_pedidos": await qs_hoje.acount(),
+        "hoje_concluidos": await qs_hoje.filter(status=Pedido.Status.CONCLUIDO).acount(),
+        "hoje_total": (await qs_hoje.aaggregate(s=Sum("total")))["s"] or 0,
     }
-    ultimos = Pedido.objects.order_by("-criado_em")[:10]
-    return render(request, "home.html", {"resumo": resumo, "ultimos": ultimos})
+    ultimos = [p async for p in Pedido.objects.order_by("-criado_em")[:10]]
+    return await arender(request, "home.html", {"resumo": resumo, "ultimos": ultimos})
@@ -1,8 +1,12 @@
 # views.py
+from django.core.cache import cache
 from django.db.models import Sum, Q
-from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
+from django.shortcuts import aget_object_or_404
 from .models import MovimentoEstoque, Produto
+from .shortcuts import (
+    RELATORIO_CACHE_TTL, arender, apaginar, aversao, chave_relatorio, condicional, querystring_normalizada,
+)
+from .signals import VERSAO_RAZAO
 
 def _aplicar_filtros(request, qs):
     """Reaproveita filtros nas duas telas."""
@@ -21,7 +25,16 @@ def _aplicar_filtros(request, qs):
         qs = qs.filter(pedido__numero=pedido)
     return qs
 
-def saidas_por_produto(request):
+async def _versao_razao():
+    # avançada a cada escrita no razão, produto ou pedido (pedidos/signals.py)
+    return await aversao(VERSAO_RAZAO)
+
+async def _validadores_relatorio(request, produto_id=None):
+    versao = await _versao_razao()
+    return f"estoque-{versao}-{produto_id or ''}-{querystring_normalizada(request)}", None
+
+@condicional(_validadores_relatorio)
+async def saidas_por_produto(request):
     """
     Lista agregada: total que saiu por produto no período.
     """
@@ -36,21 +49,22 @@ def saidas_por_produto(request):
     )
 
     # paginação
-    paginator = Paginator(agregados, 25)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    chave = chave_relatorio("saidas-por-produto", await _versao_razao(), request)
+    page_obj = await apaginar(agregados, request.GET.get("page"), chave_cache=chave)
 
     ctx = {
         "rows": page_obj,
         "page_obj": page_obj,
         "querystring": "&".join([f"{k}={v}" for k, v in request.GET.items() if k != "page"]),
     }
-    return render(request, "estoque/saidas_por_produto.html", ctx)
+    return await arender(request, "estoque/saidas_por_produto.html", ctx)
 
-def saidas_do_produto_detail(request, produto_id):
+@condicional(_validadores_relatorio)
+async def saidas_do_produto_detail(request, produto_id):
     """
     Detalhe: ao clicar no produto, mostra por pedido quanto saiu.
     """
-    produto = get_object_or_404(Produto, pk=produto_id)
+    produto = await aget_object_or_404(Produto, pk=produto_id)
 
     qs = MovimentoEstoque.objects.filter(
         tipo=MovimentoEstoque.Tipo.SAIDA,
@@ -66,16 +80,19 @@ def saidas_do_produto_detail(request, produto_id):
     )
 
     # (opcional) lista “linha a linha” para ver fragmentações/estornos
-    linhas = qs.order_by("-criado_em")
+    chave = chave_relatorio("saidas-do-produto", await _versao_razao(), request, produto_id)
+    linhas = await cache.aget(f"{chave}:linhas")
+    if linhas is None:
+        linhas = [m async for m in qs.order_by("-criado_em")[:100]]
+        await cache.aset(f"{chave}:linhas", linhas, RELATORIO_CACHE_TTL)
 
-    paginator = Paginator(por_pedido, 25)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = await apaginar(por_pedido, request.GET.get("page"), chave_cache=chave)
 
     ctx = {
         "produto": produto,
         "rows": page_obj,
-        "linhas": linhas[:100],  # mostra até 100 últimas linhas como referência
+        "linhas": linhas,  # mostra até 100 últimas linhas como referência
         "page_obj": page_obj,
         "querystring": "&".join([f"{k}={v}" for k, v in request.GET.items() if k != "page"]),
     }
-    return render(request, "estoque/saidas_do_produto_detail.html", ctx)
+    return await arender(request, "estoque/saidas_do_produto_detail.html", ctx)
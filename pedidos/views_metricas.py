@@ -0,0 +1,19 @@
+# views_metricas.py
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from .metricas import resumo_periodo
+from .shortcuts import arender
+
+async def tempos_cozinha(request):
+    """
+    Tempo de preparo (p50/p90/p99) por hora e por produto, e fila da cozinha.
+    Lê o rollup TempoPreparoHora; só a hora corrente é calculada na hora.
+    """
+    try:
+        horas = min(max(int(request.GET.get("horas", 24)), 1), 24 * 31)
+    except ValueError:
+        horas = 24
+
+    resumo = await sync_to_async(resumo_periodo)(timezone.now() - timedelta(hours=horas))
+    return await arender(request, "pedidos/tempos_cozinha.html", {"horas": horas, **resumo})